@@ -0,0 +1,146 @@
+"""
+Fetch the documents of search results a page at a time from MongoDB
+"""
+import itertools
+
+
+class BulkResults:
+    """
+    Wraps the results of a search on a MongoDB-backed catalog, fetching the
+    RunStop documents of each page of results in one query.
+
+    Iterating over the catalog itself looks up the RunStop document of each
+    run separately, which costs a round trip per run. Catalogs are recognized
+    by duck typing: they need the ``_run_start_collection``,
+    ``_run_stop_collection`` and ``_query`` attributes of intake-bluesky's
+    BlueskyMongoCatalog. Anything else is passed through to the catalog.
+
+    Parameters
+    ----------
+    results : Catalog
+        The results of a search
+    page_size : int
+        Number of runs per query for RunStop documents
+    projection : dict, optional
+        Maps 'start' and 'stop' to lists of the fields to fetch, or to None
+        for all fields
+    sort : list, optional
+        (field, direction) pairs to sort RunStart documents by, as in pymongo.
+        By default, sort newest first.
+    """
+    def __init__(self, results, page_size, projection=None, sort=None):
+        self._results = results
+        self._page_size = page_size
+        self._projection = projection or {}
+        self._sort = sort or [('time', -1)]
+
+    @staticmethod
+    def supports(results):
+        return all(hasattr(results, attr) for attr in
+                   ('_run_start_collection', '_run_stop_collection', '_query'))
+
+    def __len__(self):
+        return self._results._run_start_collection.count_documents(self._results._query)
+
+    def __getitem__(self, uid):
+        return self._results[uid]
+
+    def __getattr__(self, name):
+        return getattr(self._results, name)
+
+    def value_counts(self, key):
+        """
+        Count the runs by the value of a field, in one aggregation query. Each
+        element of an array counts separately.
+
+        Parameters
+        ----------
+        key : str
+            A field of the RunStart document, or of the RunStop document if
+            prefixed with 'stop.'
+
+        Returns
+        -------
+        counts : list
+            List of (value, count) pairs, most common first
+        """
+        pipeline = [{'$match': self._results._query}]
+        if key.startswith('stop.'):
+            # Join each run to its RunStop document, as 'stop'.
+            pipeline.extend([
+                {'$project': {'_id': False, 'uid': True}},
+                {'$lookup': {'from': self._results._run_stop_collection.name,
+                             'localField': 'uid', 'foreignField': 'run_start',
+                             'as': 'stop'}},
+                {'$unwind': '$stop'}])
+        pipeline.extend([
+            {'$project': {'_id': False, 'value': '$' + key}},
+            # Missing and null values, and empty arrays, are dropped here.
+            {'$unwind': '$value'},
+            {'$group': {'_id': '$value', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}}])
+        return [(group['_id'], group['count']) for group in
+                self._results._run_start_collection.aggregate(pipeline)
+                if not isinstance(group['_id'], (dict, list))]
+
+    def histogram(self, bin_size):
+        """
+        Count the runs by start time, in one aggregation query.
+
+        Parameters
+        ----------
+        bin_size : float
+            Width of the bins, in seconds
+
+        Returns
+        -------
+        counts : dict
+            Maps the start of each bin with any runs to the number of runs
+        newest_time : float or None
+            The latest start time, or None if there are no runs
+        """
+        groups = list(self._results._run_start_collection.aggregate([
+            {'$match': self._results._query},
+            {'$group': {'_id': {'$subtract': ['$time', {'$mod': ['$time', bin_size]}]},
+                        'count': {'$sum': 1}, 'newest': {'$max': '$time'}}}]))
+        counts = {group['_id']: group['count'] for group in groups}
+        newest_time = max((group['newest'] for group in groups), default=None)
+        return counts, newest_time
+
+    def items(self):
+        "Yield (uid, DocumentEntry) pairs in sort order."
+        starts = self._results._run_start_collection.find(
+            self._results._query, _mongo_projection(self._projection.get('start')),
+            sort=self._sort, batch_size=self._page_size)
+        stop_projection = _mongo_projection(self._projection.get('stop'), 'run_start')
+        while True:
+            page = list(itertools.islice(starts, self._page_size))
+            if not page:
+                return
+            uids = [start['uid'] for start in page]
+            stops = {stop['run_start']: stop for stop in
+                     self._results._run_stop_collection.find(
+                         {'run_start': {'$in': uids}}, stop_projection)}
+            for start in page:
+                yield start['uid'], DocumentEntry(start, stops.get(start['uid']))
+            if len(page) < self._page_size:
+                return
+
+
+class DocumentEntry:
+    """
+    Stands in for a catalog entry, with its RunStart and RunStop documents only
+    """
+    def __init__(self, start, stop=None):
+        self.metadata = {'start': start, 'stop': stop}
+
+    def describe(self):
+        return {'metadata': self.metadata}
+
+
+def _mongo_projection(fields, *required):
+    "Translate a list of fields, or None for all, into a MongoDB projection."
+    projection = {'_id': False}
+    if fields is not None:
+        projection.update(dict.fromkeys(itertools.chain(fields, required), True))
+    return projection
@@ -6,7 +6,14 @@
 # provided in full here as an example.
 #
 #from datetime import datetime
+#from bluesky_browser.search import search_result_fields, SortableValue
 #
+## Declaring the fields used lets catalogs that support it fetch only those,
+## and declaring the fields behind columns lets them sort by those columns.
+#@search_result_fields(start=['uid', 'time', 'scan_id', 'plan_name'],
+#                      stop=['uid', 'time', 'exit_status'],
+#                      sort={'Unique ID': 'uid', 'Transient Scan ID': 'scan_id',
+#                            'Plan Name': 'plan_name', 'Start Time': 'time'})
 #def search_result_row(entry):
 #    "Take in an entry and return a dict mapping column names to values."
 #    start = entry.metadata['start']
@@ -15,19 +22,73 @@
 #    duration = datetime.fromtimestamp(stop['time']) - start_time
 #    if stop is None:
 #        str_duration = '-'
+#        seconds = None
 #    else:
 #        duration = datetime.fromtimestamp(stop['time']) - start_time
 #        str_duration = str(duration)
 #        str_duration = str_duration[:str_duration.index('.')]
+#        seconds = stop['time'] - start['time']
+#    scan_id = start.get('scan_id')
+#    # SortableValues are displayed as the first value and sorted by the second.
 #    return {'Unique ID': start['uid'][:8],
-#            'Transient Scan ID': str(start.get('scan_id', '-')),
+#            'Transient Scan ID': SortableValue('-' if scan_id is None else scan_id, scan_id),
 #            'Plan Name': start.get('plan_name', '-'),
-#            'Start Time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-#            'Duration': str_duration,
+#            'Start Time': SortableValue(start_time.strftime('%Y-%m-%d %H:%M:%S'),
+#                                        start['time']),
+#            'Duration': SortableValue(str_duration, seconds),
 #            'Exit Status': '-' if stop is None else stop['exit_status']}
 #
 #c.SearchState.search_result_row = search_result_row
 #
+## Alternatively, format a page of rows at once from columns of NumPy arrays,
+## which is much faster for large numbers of results. search_result_row is
+## still used if this fails.
+#
+#import numpy
+#
+#@search_result_fields(start=['uid', 'time', 'scan_id', 'plan_name'],
+#                      stop=['time', 'exit_status'],
+#                      sort={'Transient Scan ID': 'scan_id', 'Start Time (UTC)': 'time'})
+#def search_result_rows(batch):
+#    "Take in columns of RunStart and RunStop fields and return columns."
+#    start = batch['start']
+#    stop = batch['stop']
+#    start_time = (start['time'] * 1e6).astype('datetime64[us]')
+#    duration = stop['time'] - start['time']  # NaN where there is no RunStop
+#    return {'Unique ID': [uid[:8] for uid in start['uid']],
+#            'Transient Scan ID': start['scan_id'],
+#            'Plan Name': start['plan_name'],
+#            'Start Time (UTC)': SortableValue(
+#                numpy.datetime_as_string(start_time, unit='s'), start['time']),
+#            'Duration': SortableValue(
+#                numpy.where(numpy.isnan(duration), '-', numpy.char.mod('%.0f s', duration)),
+#                duration),
+#            'Exit Status': [status if isinstance(status, str) else '-'
+#                            for status in stop['exit_status']]}
+#
+#c.SearchState.search_result_rows = search_result_rows
+#
+## Wait for this many seconds of quiet (e.g. while the user is typing a custom
+## query) before submitting a search.
+#
+#c.SearchState.search_debounce = 0.3
+#
+## Index the RunStart and RunStop documents of each subcatalog in a local
+## SQLite database, for instant and full-text search.
+#
+#c.SearchState.metadata_index_path = 'bluesky_browser_index.sqlite'
+#
+## Count the most common values of these fields among the search results.
+## Prefix fields of the RunStop document with 'stop.'.
+#
+#c.SearchState.facet_keys = ['plan_name', 'detectors', 'stop.exit_status']
+#
+## Match the quick filter against these fields of the RunStart document. The
+## default is ['uid', 'scan_id', 'plan_name', 'sample', 'proposal']. None
+## matches all of them, but then whole RunStart documents must be fetched.
+#
+#c.SearchState.filter_fields = ['uid', 'scan_id', 'plan_name', 'sample', 'proposal', 'detectors']
+#
 ## VIEWER
 #
 #from bluesky_browser.viewer.header_tree import HeaderTreeFactory
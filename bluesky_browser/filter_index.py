@@ -0,0 +1,124 @@
+"""
+Filter loaded search results by the text of their metadata, in memory
+"""
+import collections
+import threading
+
+
+def filter_text(doc, fields=None):
+    """
+    Gather the values in a document into one string to be indexed.
+
+    Parameters
+    ----------
+    doc : dict
+    fields : list, optional
+        Names of the fields to include. By default, include all.
+    """
+    if fields is not None:
+        doc = {field: doc[field] for field in fields if field in doc}
+    return '\n'.join(document_text(doc))
+
+
+def document_text(doc):
+    """
+    Yield the text of the strings and numbers in a (nested) document, for
+    the quick filter and for full-text indexing alike.
+    """
+    if isinstance(doc, dict):
+        for value in doc.values():
+            yield from document_text(value)
+    elif isinstance(doc, (list, tuple)):
+        for value in doc:
+            yield from document_text(value)
+    elif isinstance(doc, (str, int, float)) and not isinstance(doc, bool):
+        yield str(doc)
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class FilterIndex:
+    """
+    A thread-safe trigram index of the text of runs, keyed by uid
+
+    A run passes the filter if its text contains every word of the filter,
+    ignoring case. Rather than checking the text of every run, only runs
+    that have all of the trigrams of the filter's words are checked. The
+    runs that pass are kept up to date as runs are added, so checking a run
+    (see accepts) is a set lookup.
+
+    Parameters
+    ----------
+    max_runs : int
+        Number of runs to keep, discarding the least recently added first
+    """
+    def __init__(self, max_runs):
+        self._max_runs = max_runs
+        self._texts = collections.OrderedDict()  # uid -> lowercase text
+        self._postings = collections.defaultdict(set)  # trigram -> uids
+        self._words = []  # lowercase words of the filter
+        self._matches = set()  # uids of runs that pass the filter
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __contains__(self, uid):
+        with self._lock:
+            return uid in self._texts
+
+    @property
+    def active(self):
+        "Whether there is a filter"
+        return bool(self._words)
+
+    def add(self, uid, text):
+        "Index (or re-index) the text of a run."
+        text = text.lower()
+        with self._lock:
+            self._discard(uid)
+            self._texts[uid] = text
+            for trigram in _trigrams(text):
+                self._postings[trigram].add(uid)
+            if self._words and all(word in text for word in self._words):
+                self._matches.add(uid)
+            while len(self._texts) > self._max_runs:
+                self._discard(next(iter(self._texts)))
+
+    def _discard(self, uid):
+        text = self._texts.pop(uid, None)
+        if text is None:
+            return
+        for trigram in _trigrams(text):
+            uids = self._postings[trigram]
+            uids.discard(uid)
+            if not uids:
+                del self._postings[trigram]
+        self._matches.discard(uid)
+
+    def set_filter(self, text):
+        "Filter by the whitespace-separated words of text; '' clears the filter."
+        words = text.lower().split()
+        with self._lock:
+            self._words = words
+            self._matches = self._search(words) if words else set()
+
+    def _search(self, words):
+        postings = [self._postings.get(trigram, set())
+                    for word in words for trigram in _trigrams(word)]
+        if postings:
+            # Words shorter than a trigram narrow nothing down; they are
+            # checked with the rest below.
+            postings.sort(key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        else:
+            candidates = self._texts
+        return {uid for uid in candidates
+                if all(word in self._texts[uid] for word in words)}
+
+    def accepts(self, uid):
+        "Whether the run passes the filter. With no filter, every run does."
+        with self._lock:
+            return not self._words or uid in self._matches
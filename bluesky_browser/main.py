@@ -60,9 +60,11 @@ class CentralWidget(QWidget):
         now = time.time()
         ONE_WEEK = 60 * 60 * 24 * 7
         self.search_widget.search_results_widget.setModel(
-            search_state.search_results_model)
+            search_state.search_results_proxy_model)
         self.search_widget.search_input_widget.search_bar.textChanged.connect(
             search_state.search_results_model.on_search_text_changed)
+        self.search_widget.search_input_widget.filter_bar.textChanged.connect(
+            search_state.search_results_proxy_model.set_filter_text)
         self.search_widget.catalog_selection_widget.catalog_list.setModel(
             search_state.catalog_selection_model)
         self.search_widget.search_input_widget.until_widget.dateTimeChanged.connect(
@@ -75,6 +77,8 @@ class CentralWidget(QWidget):
             QDateTime.fromSecsSinceEpoch(now - ONE_WEEK))
         self.search_widget.catalog_selection_widget.catalog_list.currentIndexChanged.connect(
             search_state.set_selected_catalog)
+        self.search_widget.catalog_selection_widget.refresh_button.clicked.connect(
+            search_state.refresh_subcatalogs)
         self.search_widget.search_results_widget.selectionModel().selectionChanged.connect(
             search_state.search_results_model.emit_selected_result)
         self.search_widget.search_results_widget.doubleClicked.connect(
@@ -87,20 +91,31 @@ class CentralWidget(QWidget):
         self.viewer.tab_titles.connect(self.summary_widget.cache_tab_titles)
         search_state.search_results_model.valid_custom_query.connect(
             self.search_widget.search_input_widget.mark_custom_query)
+        search_state.results_status.connect(
+            self.search_widget.search_results_status.setText)
+        search_state.histogram_updated.connect(
+            self.search_widget.search_input_widget.timeline_widget.set_histogram)
+        search_state.facets_updated.connect(
+            self.search_widget.facet_widget.set_facets)
+        self.search_widget.facet_widget.facet_selected.connect(
+            self.search_widget.search_input_widget.refine_query)
+        self.search_widget.visibility_changed.connect(search_state.set_visible)
         search_state.enabled = True
         search_state.search()
 
         if zmq_address:
-
-            def request_reload_after_delay(uid):
-                DELAY = 2  # Wait for RunStart to be available in Catalog.
-                time.sleep(DELAY)
-                search_state.request_reload()
-
+            # New runs and RunStops poke reloads, so there is little to poll for.
+            search_state.push_reloads = True
             self.consumer_thread = ConsumerThread(zmq_address=zmq_address)
             self.consumer_thread.documents.connect(self.viewer.consumer)
             self.consumer_thread.new_run_uid.connect(
-                request_reload_after_delay)
+                search_state.invalidate_query_cache)
+            self.consumer_thread.new_run_uid.connect(
+                search_state.reload_when_available)
+            self.consumer_thread.new_run_start.connect(
+                search_state.show_live_run)
+            self.consumer_thread.new_run_stop.connect(
+                search_state.show_run_stop)
             self.consumer_thread.start()
 
 
@@ -0,0 +1,407 @@
+"""
+A local SQLite index of RunStart and RunStop documents, for instant search
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from .bulk import BulkResults, DocumentEntry
+from .filter_index import document_text
+
+
+log = logging.getLogger('bluesky_browser')
+PAGE_SIZE = 500  # rows fetched from SQLite at a time while iterating results
+INCOMPLETE_WINDOW = 60 * 60 * 24  # seconds; how far back to look for RunStops
+# Fields of the RunStart document that get their own indexed columns
+COLUMNS = {'uid': 'uid', 'time': 'time', 'plan_name': 'plan_name', 'scan_id': 'scan_id'}
+# Mongo's $ne (and equality with None) also match documents without the field,
+# which SQL comparisons do not, so queries using them go to the catalog.
+COMPARISONS = {'$eq': '=', '$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    catalog TEXT NOT NULL,
+    uid TEXT NOT NULL,
+    time REAL NOT NULL,
+    plan_name TEXT,
+    scan_id INTEGER,
+    start TEXT NOT NULL,
+    stop TEXT,
+    PRIMARY KEY (catalog, uid)
+);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (catalog, time);
+CREATE INDEX IF NOT EXISTS runs_plan_name ON runs (catalog, plan_name);
+CREATE INDEX IF NOT EXISTS runs_scan_id ON runs (catalog, scan_id);
+CREATE TABLE IF NOT EXISTS catalogs (
+    name TEXT PRIMARY KEY,
+    populated REAL
+);
+"""
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5(text);
+"""
+
+
+class UnsupportedQuery(Exception):
+    "The query cannot be answered by the index; ask the catalog instead."
+
+
+class MetadataIndex:
+    """
+    A local SQLite index of the RunStart and RunStop documents in catalogs.
+
+    Time, plan_name and scan_id are indexed, and, if SQLite was built with
+    FTS5, all text in the RunStart document is indexed for full-text search
+    via the Mongo-style query ``{'$text': {'$search': 'words'}}``.
+
+    It is safe to use from multiple threads; each thread gets its own
+    connection.
+
+    Parameters
+    ----------
+    path : str
+        Path to the database file. It is created if it does not exist.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection
+        with connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            try:
+                connection.executescript(FTS_SCHEMA)
+            except sqlite3.OperationalError:
+                log.warning("SQLite was built without FTS5. Full-text search "
+                            "will be answered by the catalog.")
+                self.full_text = False
+            else:
+                self.full_text = True
+
+    @property
+    def _connection(self):
+        try:
+            return self._local.connection
+        except AttributeError:
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._local.connection = connection
+            return connection
+
+    def is_populated(self, name):
+        "Whether the catalog with this name has been fully indexed"
+        row = self._connection.execute(
+            'SELECT populated FROM catalogs WHERE name = ?', (name,)).fetchone()
+        return row is not None and row[0] is not None
+
+    def update(self, name, catalog):
+        """
+        Index the runs in a catalog.
+
+        The first time, every run is indexed. After that, only runs newer than
+        the newest one indexed, and recent runs that had no RunStop document
+        yet, are fetched. MongoDB-backed catalogs are read through
+        BulkResults, a page of runs per query.
+
+        Parameters
+        ----------
+        name : str
+            The name of the catalog, under which its runs are indexed
+        catalog : Catalog
+        """
+        t0 = time.monotonic()
+        connection = self._connection
+        if not self.is_populated(name):
+            entries = _items(catalog)
+        else:
+            newest, = connection.execute(
+                'SELECT MAX(time) FROM runs WHERE catalog = ?', (name,)).fetchone()
+            if newest is None:
+                entries = _items(catalog)
+            else:
+                incomplete = [uid for uid, in connection.execute(
+                    'SELECT uid FROM runs WHERE catalog = ? AND stop IS NULL AND time >= ?',
+                    (name, newest - INCOMPLETE_WINDOW))]
+                query = {'time': {'$gte': newest}}
+                if incomplete:
+                    query = {'$or': [query, {'uid': {'$in': incomplete}}]}
+                entries = _items(catalog.search(query))
+        batch = []
+        counter = 0
+        for uid, entry in entries:
+            batch.append((entry.metadata['start'], entry.metadata['stop']))
+            if len(batch) == PAGE_SIZE:
+                self.insert(name, batch)
+                counter += len(batch)
+                batch.clear()
+        self.insert(name, batch)
+        counter += len(batch)
+        with connection:
+            connection.execute(
+                'INSERT INTO catalogs (name, populated) VALUES (?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET populated = excluded.populated',
+                (name, time.time()))
+        duration = time.monotonic() - t0
+        log.debug("Indexed %d runs from %r (%.3f s).", counter, name, duration)
+
+    def insert(self, name, runs):
+        """
+        Insert or update runs.
+
+        Parameters
+        ----------
+        name : str
+            The name of the catalog that the runs belong to
+        runs : list
+            List of (start, stop) document pairs. stop may be None.
+        """
+        connection = self._connection
+        with connection:
+            for start, stop in runs:
+                connection.execute(
+                    'INSERT INTO runs (catalog, uid, time, plan_name, scan_id, start, stop) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (catalog, uid) DO UPDATE SET stop = excluded.stop',
+                    (name, start['uid'], start['time'], start.get('plan_name'),
+                     start.get('scan_id'), json.dumps(start, default=str),
+                     None if stop is None else json.dumps(stop, default=str)))
+                # An upsert (unlike INSERT OR REPLACE) keeps the rowid stable.
+                rowid, = connection.execute(
+                    'SELECT rowid FROM runs WHERE catalog = ? AND uid = ?',
+                    (name, start['uid'])).fetchone()
+                if self.full_text:
+                    connection.execute('DELETE FROM runs_fts WHERE rowid = ?', (rowid,))
+                    connection.execute('INSERT INTO runs_fts (rowid, text) VALUES (?, ?)',
+                                       (rowid, ' '.join(document_text(start))))
+
+    def histogram(self, name, bin_size):
+        """
+        Count the runs indexed from one catalog by start time.
+
+        Parameters
+        ----------
+        name : str
+        bin_size : float
+            Width of the bins, in seconds
+
+        Returns
+        -------
+        counts : dict
+            Maps the start of each bin with any runs to the number of runs
+        """
+        rows = self._connection.execute(
+            'SELECT CAST(time / ? AS INTEGER) AS bin, COUNT(*) FROM runs '
+            'WHERE catalog = ? GROUP BY bin', (bin_size, name))
+        return {i * bin_size: count for i, count in rows}
+
+    def search(self, name, query, sort=None):
+        """
+        Search the runs indexed from one catalog.
+
+        Parameters
+        ----------
+        name : str
+        query : dict
+            A Mongo-style query on the RunStart document
+        sort : list, optional
+            A (field, direction) pair, as in pymongo, in a list. The field
+            must be one of COLUMNS. By default, sort newest first.
+
+        Returns
+        -------
+        results : IndexedResults
+
+        Raises
+        ------
+        UnsupportedQuery
+            If the query or sort uses anything the index cannot answer
+        """
+        where, params = self._translate(query)
+        if sort is None:
+            order = ('time', True)
+        else:
+            try:
+                (field, direction), = sort
+                order = (COLUMNS[field], direction < 0)
+            except (KeyError, ValueError):
+                raise UnsupportedQuery(f'sort by {sort!r}')
+        return IndexedResults(self, name, where, params, order)
+
+    def _translate(self, query):
+        "Translate a Mongo-style query into a SQL WHERE clause and parameters."
+        clauses = []
+        params = []
+        for key, value in query.items():
+            if key in ('$and', '$or'):
+                subclauses = []
+                for subquery in value:
+                    subclause, subparams = self._translate(subquery)
+                    subclauses.append(subclause)
+                    params.extend(subparams)
+                if subclauses:
+                    joiner = ' AND ' if key == '$and' else ' OR '
+                    clauses.append('(' + joiner.join(subclauses) + ')')
+            elif key == '$text':
+                if not self.full_text:
+                    raise UnsupportedQuery(key)
+                # Mongo matches any of the words; FTS5 would require all.
+                terms = ' OR '.join('"{}"'.format(term.replace('"', '""'))
+                                    for term in value['$search'].split())
+                clauses.append('rowid IN (SELECT rowid FROM runs_fts WHERE runs_fts MATCH ?)')
+                params.append(terms)
+            elif key.startswith('$'):
+                raise UnsupportedQuery(key)
+            else:
+                subclauses, subparams = _translate_field(key, value)
+                clauses.extend(subclauses)
+                params.extend(subparams)
+        return ' AND '.join(clauses) or '1', params
+
+
+class IndexedResults:
+    """
+    The results of a search on MetadataIndex, quacking like a search on a Catalog
+    """
+    def __init__(self, index, name, where, params, order=('time', True)):
+        self._index = index
+        self._name = name
+        self._where = where
+        self._params = params
+        self._order = order  # (column, descending)
+
+    def __len__(self):
+        count, = self._index._connection.execute(
+            f'SELECT COUNT(*) FROM runs WHERE catalog = ? AND ({self._where})',
+            [self._name] + self._params).fetchone()
+        return count
+
+    def __getitem__(self, uid):
+        row = self._index._connection.execute(
+            f'SELECT start, stop FROM runs WHERE catalog = ? AND uid = ? AND ({self._where})',
+            [self._name, uid] + self._params).fetchone()
+        if row is None:
+            raise KeyError(uid)
+        return _entry(*row)
+
+    def value_counts(self, key):
+        """
+        Count the runs by the value of a field. Each element of an array
+        counts separately.
+
+        Parameters
+        ----------
+        key : str
+            A field of the RunStart document, or of the RunStop document if
+            prefixed with 'stop.'
+
+        Returns
+        -------
+        counts : list
+            List of (value, count) pairs, most common first
+        """
+        column = 'start'
+        if key.startswith('stop.'):
+            column = 'stop'
+            key = key[len('stop.'):]
+        path = '$."{}"'.format(key.replace('"', '""'))
+        return self._index._connection.execute(
+            f'SELECT json_each.value, COUNT(*) AS n '
+            f'FROM (SELECT {column} AS doc FROM runs WHERE catalog = ? AND ({self._where})), '
+            f"json_each(doc, ?) WHERE json_each.type NOT IN ('object', 'array', 'null') "
+            f'GROUP BY json_each.value ORDER BY n DESC',
+            [self._name] + self._params + [path]).fetchall()
+
+    def items(self):
+        """
+        Yield (uid, DocumentEntry) pairs in sort order, a page at a time.
+
+        The iterator may be handed from thread to thread, so each page is read
+        through the connection of the thread asking for it.
+        """
+        column, descending = self._order
+        direction = 'DESC' if descending else 'ASC'
+        # Page by (column, uid) rather than OFFSET, which gets slower with depth.
+        after = '1'
+        after_params = []
+        while True:
+            rows = self._index._connection.execute(
+                f'SELECT uid, {column}, start, stop FROM runs '
+                f'WHERE catalog = ? AND ({self._where}) AND ({after}) '
+                f'ORDER BY {column} {direction}, uid {direction} LIMIT ?',
+                [self._name] + self._params + after_params + [PAGE_SIZE]).fetchall()
+            for uid, _, start, stop in rows:
+                yield uid, _entry(start, stop)
+            if len(rows) < PAGE_SIZE:
+                return
+            uid, value, _, _ = rows[-1]
+            after, after_params = _after(column, descending, value, uid)
+
+
+def _items(results):
+    "Iterate over the (uid, entry) pairs of a catalog or search results."
+    if BulkResults.supports(results):
+        results = BulkResults(results, PAGE_SIZE)
+    return results.items()
+
+
+def _entry(start, stop):
+    "Make a DocumentEntry from the JSON of its documents."
+    return DocumentEntry(json.loads(start), None if stop is None else json.loads(stop))
+
+
+def _translate_field(key, value):
+    "Translate a condition on one field into SQL clauses and parameters."
+    if key in COLUMNS:
+        column = COLUMNS[key]
+        any_element = None
+        path_params = []
+    else:
+        column = 'json_extract(start, ?)'
+        # Like Mongo, let a value match the elements of an array too.
+        any_element = 'EXISTS (SELECT 1 FROM json_each(start, ?) WHERE json_each.value {})'
+        path_params = ['$."{}"'.format(key.replace('"', '""'))]
+    if not isinstance(value, dict):
+        value = {'$eq': value}
+    clauses = []
+    params = []
+    for operator, operand in value.items():
+        if (operand is None or isinstance(operand, (dict, list))) and operator != '$in':
+            raise UnsupportedQuery(operator)
+        if operator == '$in':
+            if any(item is None or isinstance(item, (dict, list)) for item in operand):
+                raise UnsupportedQuery(operator)
+            condition = 'IN ({})'.format(', '.join('?' * len(operand)))
+            operand = list(operand)
+        elif operator == '$eq':
+            condition = '= ?'
+            operand = [operand]
+        elif operator in COMPARISONS:
+            # Comparisons do not reach into arrays.
+            clauses.append(f'{column} {COMPARISONS[operator]} ?')
+            params.extend(path_params)
+            params.append(operand)
+            continue
+        else:
+            raise UnsupportedQuery(operator)
+        if any_element is None:
+            clauses.append(f'{column} {condition}')
+        else:
+            clauses.append(any_element.format(condition))
+        params.extend(path_params)
+        params.extend(operand)
+    return clauses, params
+
+
+def _after(column, descending, value, uid):
+    """
+    A WHERE clause, and its parameters, for the rows after (value, uid) when
+    ordered by (column, uid). As in SQLite and Mongo, NULL sorts first.
+    """
+    if descending:
+        if value is None:
+            return f'{column} IS NULL AND uid < ?', [uid]
+        return (f'{column} < ? OR {column} IS NULL OR ({column} = ? AND uid < ?)',
+                [value, value, uid])
+    if value is None:
+        return f'{column} IS NOT NULL OR uid > ?', [uid]
+    return f'{column} > ? OR ({column} = ? AND uid > ?)', [value, value, uid]
@@ -2,18 +2,38 @@
 Experimental Qt-based data browser for bluesky
 """
 import ast
+import bisect
+import collections
 from datetime import datetime
 import event_model
 import functools
+import inspect
 import itertools
+import json
 import jsonschema
 import logging
+import math
+import numbers
+import numpy
+import operator
 import queue
+import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-from qtpy.QtCore import Qt, Signal, QThread
-from qtpy.QtGui import QStandardItemModel, QStandardItem
+from qtpy.QtCore import (
+    Qt,
+    Signal,
+    QAbstractTableModel,
+    QDateTime,
+    QModelIndex,
+    QRectF,
+    QSortFilterProxyModel,
+    QThread,
+    QTimer,
+    )
+from qtpy.QtGui import QPainter, QStandardItemModel, QStandardItem
 from qtpy.QtWidgets import (
     QAbstractItemView,
     QPushButton,
@@ -27,11 +47,32 @@ from qtpy.QtWidgets import (
     QVBoxLayout,
     QWidget,
     QTableView,
+    QTreeWidget,
+    QTreeWidgetItem,
     )
+from traitlets.traitlets import Float, List, Unicode
+
+from .bulk import BulkResults, DocumentEntry
+from .filter_index import FilterIndex, filter_text
+from .metadata_index import INCOMPLETE_WINDOW, MetadataIndex, UnsupportedQuery
 from .utils import load_config, ConfigurableQObject, Callable
 
 
-MAX_SEARCH_RESULTS = 100  # TODO Use fetchMore instead of a hard limit.
+FETCH_BATCH_SIZE = 100  # number of results paged in per fetchMore
+MAX_CACHED_ROWS = 10000  # formatted rows kept in memory; others are re-formatted on demand
+MAX_CACHED_ROW_BYTES = 16 * 2**20  # approximate memory cap on those rows
+MAX_CACHED_QUERIES = 32
+MAX_PARALLEL_SEARCHES = 8
+MAX_CACHED_ENTRIES = 100
+PREFETCH_DISTANCE = 5  # rows on either side of the selection
+HISTOGRAM_BIN_SIZE = 60 * 60 * 24  # seconds; width of the bins of the timeline
+FACET_LIMIT = 10  # most common values shown for each facet
+MAX_FACET_RUNS = 10000  # runs examined for facets when the index cannot count them
+MAX_LIVE_RUNS = 100  # RunStart documents from the live stream awaiting a RunStop
+ALL_CATALOGS = 'All catalogs'
+CACHED_QUERY_TTL = 300  # seconds
+MAX_FILTER_RUNS = 100000  # runs whose metadata is indexed for the quick filter
+SORT_ROLE = Qt.UserRole  # data role of the keys that search results are sorted by
 log = logging.getLogger('bluesky_browser')
 BAD_TEXT_INPUT = """
 QLineEdit {
@@ -43,10 +84,64 @@ QLineEdit {
     background-color: rgb(255, 255, 255);
 }
 """
-RELOAD_INTERVAL = 11
+RELOAD_INTERVAL = 11  # seconds between reloads while new runs keep appearing
+MAX_RELOAD_INTERVAL = 300  # seconds; reloads back off up to this when nothing changes
+# seconds to wait between looking up a new run in the catalog, before giving up
+NEW_RUN_RETRY_DELAYS = (0.25, 0.5, 1, 2, 4, 8)
 _validate = functools.partial(jsonschema.validate, types={'array': (list, tuple)})
 
 
+def search_result_fields(*, start=None, stop=None, sort=None):
+    """
+    Declare the fields of the RunStart and RunStop documents that a
+    search_result_row function uses.
+
+    Catalogs that support it are then asked to fetch only those fields, and
+    to sort the results by the fields behind columns.
+
+    Parameters
+    ----------
+    start : list, optional
+        Names of fields in the RunStart document. By default, fetch all.
+    stop : list, optional
+        Names of fields in the RunStop document. By default, fetch all.
+    sort : dict, optional
+        Maps column names to the fields of the RunStart document that they
+        are ordered by, for columns that can be sorted by the catalog.
+
+    Examples
+    --------
+    >>> @search_result_fields(start=['uid', 'time', 'plan_name'],
+    ...                       sort={'Start Time': 'time'})
+    ... def search_result_row(entry):
+    ...     ...
+    """
+    def decorator(func):
+        func.fields = {'start': start, 'stop': stop}
+        func.sort_fields = sort or {}
+        return func
+    return decorator
+
+
+class SortableValue(collections.namedtuple('SortableValue', ['display', 'key'])):
+    """
+    A value in a search result row that is displayed one way and sorted by
+    another, e.g. a formatted time, sorted by the number of seconds.
+
+    Other values are sorted by themselves. Numbers sort before strings, and
+    None (or NaN) after both, so use numbers for numeric keys, e.g. seconds
+    rather than a formatted duration.
+
+    In the columns returned by search_result_rows, a SortableValue of two
+    sequences stands for a column of SortableValues.
+    """
+    __slots__ = ()
+
+
+@search_result_fields(start=['uid', 'time', 'scan_id', 'plan_name'],
+                      stop=['uid', 'time', 'exit_status'],
+                      sort={'Unique ID': 'uid', 'Transient Scan ID': 'scan_id',
+                            'Plan Name': 'plan_name', 'Start Time': 'time'})
 def default_search_result_row(entry):
     metadata = entry.describe()['metadata']
     start = metadata['start']
@@ -54,25 +149,63 @@ def default_search_result_row(entry):
     start_time = datetime.fromtimestamp(start['time'])
     if stop is None:
         str_duration = '-'
+        seconds = None
     else:
         duration = datetime.fromtimestamp(stop['time']) - start_time
         str_duration = str(duration)
         str_duration = str_duration[:str_duration.index('.')]
+        seconds = stop['time'] - start['time']
+    scan_id = start.get('scan_id')
     return {'Unique ID': start['uid'][:8],
-            'Transient Scan ID': (start.get('scan_id', '-')),
+            'Transient Scan ID': SortableValue('-' if scan_id is None else scan_id, scan_id),
             'Plan Name': start.get('plan_name', '-'),
-            'Start Time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'Duration': str_duration,
+            'Start Time': SortableValue(start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                                        start['time']),
+            'Duration': SortableValue(str_duration, seconds),
             'Exit Status': '-' if stop is None else stop['exit_status']}
 
 
+class ResultRow(collections.namedtuple('ResultRow', ['uid', 'has_stop', 'time', 'catalog'])):
+    """
+    What SearchResultsModel holds for each row.
+
+    The formatted row itself lives in the RowCache of SearchState. catalog is
+    the name of the subcatalog that the run was found in, or None for a
+    provisional row made from a live RunStart document.
+    """
+    __slots__ = ()
+
+    @property
+    def key(self):
+        "Key into RowCache"
+        return (self.uid, self.has_stop)
+
+
 class SearchState(ConfigurableQObject):
     """
     Encapsulates CatalogSelectionModel and SearchResultsModel. Executes search.
+
+    Searching, formatting rows and counting run on worker threads, each
+    serving a queue. The Qt main thread only receives the finished results.
     """
-    new_results_catalog = Signal([])
-    new_results_catalog = Signal([])
+    subcatalogs_listed = Signal([list, bool])
+    subcatalogs_opened = Signal([str, list])
+    histogram_updated = Signal([int, object])
+    facets_updated = Signal([object, bool])
+    new_results = Signal([int, str, object])
+    new_rows = Signal([int, list, object])
+    new_runs = Signal([int, list])
+    new_count = Signal([int, str, int])
+    run_not_found = Signal([str])
+    rows_formatted = Signal([list])
+    results_status = Signal([str])
     search_result_row = Callable(default_search_result_row, config=True)
+    search_result_rows = Callable(None, allow_none=True, config=True)
+    search_debounce = Float(0.3, config=True)
+    metadata_index_path = Unicode(None, allow_none=True, config=True)
+    facet_keys = List(Unicode(), ['plan_name', 'detectors', 'stop.exit_status'], config=True)
+    filter_fields = List(Unicode(), ['uid', 'scan_id', 'plan_name', 'sample', 'proposal'],
+                         allow_none=True, config=True)
 
     def __init__(self, catalog):
         self.update_config(load_config())
@@ -80,33 +213,95 @@ class SearchState(ConfigurableQObject):
         self.enabled = False  # to block searches during initial configuration
         self.catalog_selection_model = CatalogSelectionModel()
         self.search_results_model = SearchResultsModel(self)
+        self.search_results_proxy_model = SearchResultsProxyModel()
+        self.search_results_proxy_model.setSourceModel(self.search_results_model)
         self._subcatalogs = []  # to support lookup by item's positional index
-        self._results = []  # to support lookup by item's positional index
-        self._results_catalog = None
-        self.list_subcatalogs()
-        self.set_selected_catalog(0)
+        self._subcatalog_instances = {}  # name -> subcatalog, instantiated on demand
+        self._subcatalog_lock = threading.Lock()  # held while instantiating
+        self._selecting = None  # name of the subcatalog (or ALL_CATALOGS) last picked
+        self.selected_catalog_name = None
+        self.selected_catalogs = {}  # name -> subcatalog, for the selected item
+        self._query = None  # the query whose results are displayed
+        self._sort = None  # [(field, direction)] for catalogs, or None for newest first
+        self._sorted_since = None  # when the displayed sorted query was submitted
+        self._generation = 0  # incremented to supersede searches in flight
+        # These map subcatalog name to...
+        self._more = {}  # whether there are more results to fetch
+        self._counts = {}  # number of results, once counted
+        self._newest_times = {}  # newest start['time'] displayed, for delta reloads
+        self._in_progress = {}  # uid -> subcatalog name, for rows with no RunStop yet
+        self._stale_rows = {}  # uid -> subcatalog name, for rows from a previous search
+        self._live_starts = collections.OrderedDict()  # uid -> RunStart from live stream
+        self._fetch_pending = False
+        # These are only used by FetchRowsThread.
+        self._results_generation = None
+        self._results_iters = {}  # subcatalog name -> iterator over results
+        # Shared across searches, so re-searching only formats new or changed runs.
+        self._row_cache = RowCache(MAX_CACHED_ROWS, MAX_CACHED_ROW_BYTES)
+        self._requested_keys = set()  # evicted rows queued for re-formatting
+        self._query_cache = QueryCache(MAX_CACHED_QUERIES, CACHED_QUERY_TTL)
+        self._query_cache_key = None  # key of the query whose results are displayed
+        self._entry_cache = EntryCache(MAX_CACHED_ENTRIES)
+        self._filter_index = FilterIndex(MAX_FILTER_RUNS)
+        self._search_pool = ThreadPoolExecutor(MAX_PARALLEL_SEARCHES)
         self.query_queue = queue.Queue()
+        self.fetch_queue = queue.Queue()
+        self.count_queue = queue.Queue()
+        self.index_queue = queue.Queue()
+        self.prefetch_queue = queue.Queue()
+        self.list_queue = queue.Queue()
+        self.histogram_queue = queue.Queue()
+        self.facet_queue = queue.Queue()
+        # subcatalog name -> (Counter of bin -> runs, newest time counted);
+        # only used by HistogramThread
+        self._histograms = {}
+        self.new_run_queue = queue.Queue()
+        self._pending_runs = {}  # uid -> (when to look next, attempt); NewRunsThread only
+        if self.metadata_index_path:
+            self._metadata_index = MetadataIndex(self.metadata_index_path)
+        else:
+            self._metadata_index = None
+        self.list_subcatalogs()
         self.show_results_event = threading.Event()
         self.reload_event = threading.Event()
+        self.visible_event = threading.Event()
+        self.visible_event.set()
+        self.push_reloads = False  # whether a live stream pokes reload_event
+        self._empty_reloads = 0  # consecutive reloads that found nothing new
 
         search_state = self
 
         super().__init__()
 
-        self.new_results_catalog.connect(self.show_results)
+        self.subcatalogs_listed.connect(self.show_subcatalogs)
+        self.subcatalogs_opened.connect(self.show_selected_catalog)
+        self.new_results.connect(self.cache_results)
+        self.new_rows.connect(self.show_rows)
+        self.new_runs.connect(self.show_new_runs)
+        self.new_count.connect(self.show_count)
+        self.rows_formatted.connect(self.show_formatted_rows)
+        self.run_not_found.connect(self.remove_provisional_row)
+
+        self._search_timer = QTimer()
+        self._search_timer.setSingleShot(True)
+        self._search_timer.timeout.connect(self._submit_search)
 
         class ReloadThread(QThread):
             def run(self):
                 while True:
                     t0 = time.monotonic()
                     # Never reload until the last reload finished being
-                    # displayed.
+                    # displayed, nor while the results are hidden.
                     search_state.show_results_event.wait()
-                    # Wait for RELOAD_INTERVAL to pass or until we are poked,
-                    # whichever happens first.
+                    search_state.visible_event.wait()
+                    # Wait for the reload interval to pass or until we are
+                    # poked, whichever happens first.
                     search_state.reload_event.wait(
-                        max(0, RELOAD_INTERVAL - (time.monotonic() - t0)))
+                        max(0, search_state.reload_interval() - (time.monotonic() - t0)))
                     search_state.reload_event.clear()
+                    if not search_state.visible_event.is_set():
+                        # Hidden while waiting. Reload when shown again.
+                        continue
                     # Reload the catalog to show any new results.
                     search_state.reload()
 
@@ -121,9 +316,202 @@ class SearchState(ConfigurableQObject):
         self.process_queries_thread = ProcessQueriesThread()
         self.process_queries_thread.start()
 
-    def request_reload(self):
-        self._results_catalog.force_reload()
-        self.reload_event.set()
+        class FetchRowsThread(QThread):
+            def run(self):
+                while True:
+                    search_state.process_fetches()
+
+        self.fetch_rows_thread = FetchRowsThread()
+        self.fetch_rows_thread.start()
+
+        class CountResultsThread(QThread):
+            def run(self):
+                while True:
+                    search_state.process_counts()
+
+        self.count_results_thread = CountResultsThread()
+        self.count_results_thread.start()
+
+        class IndexThread(QThread):
+            def run(self):
+                while True:
+                    search_state.process_index_updates()
+
+        self.index_thread = IndexThread()
+        if self._metadata_index is not None:
+            self.index_thread.start()
+
+        class PrefetchThread(QThread):
+            def run(self):
+                while True:
+                    search_state.process_prefetches()
+
+        self.prefetch_thread = PrefetchThread()
+        self.prefetch_thread.start()
+
+        class NewRunsThread(QThread):
+            def run(self):
+                while True:
+                    search_state.process_new_runs()
+
+        self.new_runs_thread = NewRunsThread()
+        self.new_runs_thread.start()
+
+        class ListSubcatalogsThread(QThread):
+            def run(self):
+                while True:
+                    search_state.process_listings()
+
+        self.list_subcatalogs_thread = ListSubcatalogsThread()
+        self.list_subcatalogs_thread.start()
+
+        class HistogramThread(QThread):
+            def run(self):
+                while True:
+                    search_state.process_histograms()
+
+        self.histogram_thread = HistogramThread()
+        self.histogram_thread.start()
+
+        class FacetsThread(QThread):
+            def run(self):
+                while True:
+                    search_state.process_facets()
+
+        self.facets_thread = FacetsThread()
+        self.facets_thread.start()
+
+    def reload_interval(self):
+        """
+        Seconds until the next reload, unless poked
+
+        Reloads back off exponentially from RELOAD_INTERVAL up to
+        MAX_RELOAD_INTERVAL while they find nothing new. When a live stream
+        pokes reloads (push_reloads), polling falls back to the maximum.
+        """
+        if self.push_reloads:
+            return MAX_RELOAD_INTERVAL
+        return min(RELOAD_INTERVAL * 2 ** self._empty_reloads, MAX_RELOAD_INTERVAL)
+
+    def set_visible(self, visible):
+        "Pause reloading while the results are hidden, and catch up when shown."
+        if visible:
+            self.visible_event.set()
+            self.reload_event.set()
+        else:
+            self.visible_event.clear()
+
+    def reload_when_available(self, uid):
+        """
+        Reload once the run with this uid (e.g. announced by a live stream)
+        can be found in the catalog.
+
+        The run is looked up in the background, retrying after each of
+        NEW_RUN_RETRY_DELAYS. If it never appears, its provisional row, if
+        any, is removed.
+        """
+        self.new_run_queue.put(uid)
+
+    def process_new_runs(self):
+        if self._pending_runs:
+            next_attempt = min(due for due, _ in self._pending_runs.values())
+            timeout = max(0, next_attempt - time.monotonic())
+        else:
+            timeout = None
+        try:
+            uid = self.new_run_queue.get(timeout=timeout)
+        except queue.Empty:
+            pass
+        else:
+            self._pending_runs[uid] = (time.monotonic(), 0)
+        now = time.monotonic()
+        found = False
+        for uid, (due, attempt) in list(self._pending_runs.items()):
+            if due > now:
+                continue
+            if self._run_available(uid):
+                log.debug("Run %s found in the catalog after %d retries.", uid, attempt)
+                del self._pending_runs[uid]
+                found = True
+            elif attempt == len(NEW_RUN_RETRY_DELAYS):
+                log.warning("Run %s did not appear in the catalog.", uid)
+                del self._pending_runs[uid]
+                self.run_not_found.emit(uid)
+            else:
+                self._pending_runs[uid] = (now + NEW_RUN_RETRY_DELAYS[attempt], attempt + 1)
+        if found:
+            self.reload_event.set()
+
+    def _run_available(self, uid):
+        "Whether the run with this uid is in any of the selected subcatalogs"
+        for name, catalog in list(self.selected_catalogs.items()):
+            try:
+                catalog.force_reload()
+                catalog[uid]
+            except KeyError:
+                continue
+            except Exception:
+                log.exception("Failed to look up run %s in %r.", uid, name)
+                continue
+            return True
+        return False
+
+    def get_entry(self, row):
+        """
+        Look up the entry for a ResultRow.
+
+        The entry is cached as a CachedEntry, so the summary, the viewer and
+        the prefetcher share one instance of its datasource.
+        """
+        key = (row.catalog,) + row.key
+        try:
+            return self._entry_cache[key]
+        except KeyError:
+            entry = CachedEntry(self._lookup_entry(row.uid, row.catalog))
+            self._entry_cache[key] = entry
+            return entry
+
+    def _lookup_entry(self, uid, name):
+        """
+        Look up an entry by uid in the subcatalog with this name, or in any
+        selected subcatalog if name is None.
+
+        This goes through the subcatalog rather than the results catalog,
+        which does not know about runs merged in by reload(). The subcatalog
+        need not be selected: rows from the previous search stay on display
+        for a while after switching subcatalogs.
+        """
+        if name is not None:
+            return self._subcatalog_instances[name][uid]
+        for catalog in list(self.selected_catalogs.values()):
+            try:
+                return catalog[uid]
+            except KeyError:
+                continue
+        raise KeyError(uid)
+
+    def prefetch(self, rows):
+        """
+        Warm the entries of these ResultRows in the background, in order.
+
+        This supersedes any prefetching still in progress.
+        """
+        self.prefetch_queue.put(rows)
+
+    def process_prefetches(self):
+        # If there is a backlog, prefetch only around the latest selection.
+        rows = _drain(self.prefetch_queue)[-1]
+        t0 = time.monotonic()
+        for row in rows:
+            if not self.prefetch_queue.empty():
+                log.debug("Abandoned prefetching around a previous selection.")
+                return
+            try:
+                self.get_entry(row).warm()
+            except Exception:
+                log.exception("Failed to prefetch run %s.", row.uid)
+        duration = time.monotonic() - t0
+        log.debug("Prefetched %d runs (%.3f s).", len(rows), duration)
 
     def apply_search_result_row(self, entry):
         try:
@@ -159,86 +547,912 @@ class SearchState(ConfigurableQObject):
             self.reload_thread.terminate()
 
     def list_subcatalogs(self):
-        self._subcatalogs.clear()
-        self.catalog_selection_model.clear()
-        for name in self.catalog:
-            self._subcatalogs.append(name)
-            self.catalog_selection_model.appendRow(QStandardItem(str(name)))
+        "List the subcatalogs in the background. See show_subcatalogs."
+        self.list_queue.put(('list', False))
+
+    def refresh_subcatalogs(self):
+        "Re-list the subcatalogs and re-instantiate the selected ones."
+        self.list_queue.put(('list', True))
+
+    def process_listings(self):
+        """
+        List the subcatalogs, or instantiate the subcatalogs for a selection
+        (see set_selected_catalog).
+        """
+        request, args = self.list_queue.get()
+        if request == 'open':
+            name, names = args
+            for name_ in names:
+                try:
+                    self._get_subcatalog(name_)
+                except Exception:
+                    log.exception("Failed to instantiate subcatalog %r.", name_)
+            self.subcatalogs_opened.emit(name, names)
+            return
+        refresh = args
+        t0 = time.monotonic()
+        try:
+            if refresh:
+                self.catalog.force_reload()
+            names = list(self.catalog)
+        except Exception:
+            # Keep the subcatalogs listed already.
+            log.exception("Failed to list subcatalogs.")
+            return
+        duration = time.monotonic() - t0
+        log.debug("Listed %d subcatalogs (%.3f s).", len(names), duration)
+        self.subcatalogs_listed.emit(names, refresh)
+
+    def show_subcatalogs(self, names, refresh):
+        if refresh:
+            self._subcatalog_instances.clear()
+        if len(names) > 1:
+            names.append(ALL_CATALOGS)
+        if names != self._subcatalogs:
+            self._subcatalogs[:] = names
+            self.catalog_selection_model.clear()
+            for name in names:
+                self.catalog_selection_model.appendRow(QStandardItem(str(name)))
+            # Views of the model go back to the first item.
+            if names:
+                self.set_selected_catalog(0)
+        elif refresh and self.selected_catalog_name is not None:
+            self.set_selected_catalog(self._subcatalogs.index(self.selected_catalog_name))
 
     def set_selected_catalog(self, item):
+        if not 0 <= item < len(self._subcatalogs):
+            # The list is empty or being repopulated.
+            return
         name = self._subcatalogs[item]
-        self.selected_catalog = self.catalog[name]()
+        if name == ALL_CATALOGS:
+            names = [name for name in self._subcatalogs if name != ALL_CATALOGS]
+        else:
+            names = [name]
+        self._selecting = name
+        if all(name_ in self._subcatalog_instances for name_ in names):
+            self._select_catalogs(name, names)
+        else:
+            # Instantiating subcatalogs may mean connecting to databases, so
+            # it is done in the background. See show_selected_catalog.
+            self.list_queue.put(('open', (name, names)))
+
+    def show_selected_catalog(self, name, names):
+        "Slot for subcatalogs instantiated by process_listings"
+        if name != self._selecting:
+            # Another subcatalog has been picked since.
+            return
+        self._select_catalogs(name, names)
+
+    def _select_catalogs(self, name, names):
+        # Leave out any that failed to instantiate.
+        selected_catalogs = {name_: self._subcatalog_instances[name_] for name_ in names
+                             if name_ in self._subcatalog_instances}
+        if (name == self.selected_catalog_name and
+                len(selected_catalogs) == len(self.selected_catalogs) and
+                all(self.selected_catalogs.get(name) is subcatalog
+                    for name, subcatalog in selected_catalogs.items())):
+            return
+        self.selected_catalog_name = name
+        self.selected_catalogs = selected_catalogs
+        if self._metadata_index is not None:
+            for name_ in selected_catalogs:
+                self.index_queue.put(name_)
+        self.histogram_queue.put(selected_catalogs)
         self.search()
 
+    def _get_subcatalog(self, name):
+        "Instantiate a subcatalog, or reuse the instance. Not for the GUI thread."
+        with self._subcatalog_lock:
+            try:
+                return self._subcatalog_instances[name]
+            except KeyError:
+                t0 = time.monotonic()
+                subcatalog = self.catalog[name]()
+                duration = time.monotonic() - t0
+                log.debug("Instantiated subcatalog %r (%.3f s).", name, duration)
+                self._subcatalog_instances[name] = subcatalog
+                return subcatalog
+
+    @property
+    def projection(self):
+        """
+        The fields that search_result_row uses (see search_result_fields)
+
+        This is a dict mapping 'start' and 'stop' to lists of field names, or
+        to None for all fields. The fields that SearchState itself uses,
+        including filter_fields, are always included.
+        """
+        funcs = [self.search_result_row]
+        if self.search_result_rows is not None:
+            # search_result_row is the fallback, so fetch its fields too.
+            funcs.append(self.search_result_rows)
+        projection = {}
+        for doc_name, required in (('start', {'uid', 'time'}), ('stop', {'uid'})):
+            fields = set(required)
+            if doc_name == 'start':
+                if self.filter_fields is None:
+                    projection[doc_name] = None
+                    continue
+                fields.update(self.filter_fields)
+            for func in funcs:
+                func_fields = getattr(func, 'fields', {}).get(doc_name)
+                if func_fields is None:
+                    fields = None
+                    break
+                fields.update(func_fields)
+            projection[doc_name] = None if fields is None else sorted(fields)
+        return projection
+
+    @property
+    def sort_fields(self):
+        "Map the names of columns that catalogs can sort by to RunStart fields."
+        sort_fields = dict(getattr(self.search_result_row, 'sort_fields', {}))
+        if self.search_result_rows is not None:
+            sort_fields.update(getattr(self.search_result_rows, 'sort_fields', {}))
+        return sort_fields
+
+    def sort_results(self, column, ascending):
+        """
+        Have catalogs sort the results by the field behind a column, if they
+        can, so that pages of results arrive in order.
+
+        Searches again if that changes the order. Sorting by a column that
+        they cannot sort by (or by None) restores the default order, newest
+        first.
+        """
+        field = self.sort_fields.get(column)
+        if field is None:
+            sort = None
+        else:
+            sort = [(field, 1 if ascending else -1)]
+            if sort == [('time', -1)]:
+                sort = None
+            elif not any(self._can_sort(name, catalog)
+                         for name, catalog in self.selected_catalogs.items()):
+                sort = None
+        if sort == self._sort:
+            return
+        self._sort = sort
+        self.search()
+
+    def _can_sort(self, name, catalog):
+        index = self._metadata_index
+        return ((index is not None and index.is_populated(name)) or
+                BulkResults.supports(catalog) or 'sort' in _search_parameters(catalog))
+
+    def _search(self, name, catalog, query, projection=None, sort=None):
+        """
+        Search catalog, pushing the projection (by default, self.projection)
+        and sort order down if the catalog supports it.
+
+        A catalog opts in by accepting ``projection`` and ``sort`` keyword
+        arguments in its search method. The sort order is a list of (field,
+        direction) pairs, as in pymongo.
+
+        If the catalog has been indexed in the MetadataIndex and the index can
+        answer the query, the index is searched instead.
+
+        If the catalog is backed by MongoDB, the results are wrapped in
+        BulkResults, so that they are fetched in O(1) queries per page rather
+        than one per run.
+        """
+        index = self._metadata_index
+        if index is not None and index.is_populated(name):
+            try:
+                return index.search(name, query, sort)
+            except UnsupportedQuery as err:
+                log.debug("Query %r cannot be answered by the index (%s).", query, err)
+        parameters = _search_parameters(catalog)
+        projection = projection or self.projection
+        kwargs = {}
+        if 'projection' in parameters:
+            kwargs['projection'] = projection
+        if sort is not None and 'sort' in parameters:
+            kwargs['sort'] = sort
+        results = catalog.search(query, **kwargs)
+        if BulkResults.supports(results):
+            return BulkResults(results, FETCH_BATCH_SIZE, projection, sort)
+        return results
+
+    def invalidate_query_cache(self, *args):
+        "Slot for new runs, which may belong in the results of any cached query"
+        self._query_cache.clear()
+
     def process_queries(self):
+        """
+        Run the newest query on each of its subcatalogs concurrently, on a
+        pool of up to MAX_PARALLEL_SEARCHES threads.
+
+        The first page of results from each subcatalog is shown as soon as it
+        is ready, merged into the rest in sort order.
+        """
         # If there is a backlog, process only the newer query.
-        block = True
-        while True:
-            try:
-                query = self.query_queue.get_nowait()
-                block = False
-            except queue.Empty:
-                if block:
-                    query = self.query_queue.get()
-                break
+        generation, catalogs, query, sort = _drain(self.query_queue)[-1]
+        if generation != self._generation:
+            return
         log.debug('Submitting query %r', query)
         t0 = time.monotonic()
-        self._results_catalog = self.selected_catalog.search(query)
+        futures = {name: self._search_pool.submit(
+                       self._search_subcatalog, generation, name, catalog, query, sort)
+                   for name, catalog in catalogs.items()}
+        # Wait for all of them, so that queries do not pile up on the pool.
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception:
+                log.exception("Query on subcatalog %r failed.", name)
+                # Clear its rows from the previous search.
+                self.new_rows.emit(generation, [], {name: 0})
+        duration = time.monotonic() - t0
+        log.debug('Query answered by %d subcatalog(s) (%.3f s).', len(futures), duration)
+
+    def _search_subcatalog(self, generation, name, catalog, query, sort):
+        "Run a query on one subcatalog and format the first page of results."
+        if generation != self._generation:
+            return
+        t0 = time.monotonic()
+        results = self._search(name, catalog, query, sort=sort)
+        duration = time.monotonic() - t0
+        if generation != self._generation:
+            # A query cannot be interrupted, but its results can be ignored.
+            log.debug('Discarded results of superseded query (%.3f s).', duration)
+            return
+        log.debug('Query submitted to %r (%.3f s).', name, duration)
+        self.new_results.emit(generation, name, results)
+        self.count_queue.put((generation, name, results))
+        iterator = iter(results.items())
+        page = list(itertools.islice(iterator, FETCH_BATCH_SIZE))
+        rows = self._format_rows(page, generation, name)
+        # Hand the rest over to FetchRowsThread before asking for more.
+        self.fetch_queue.put(('results', generation, (name, iterator)))
+        self.new_rows.emit(generation, rows, {name: len(page)})
+
+    def process_index_updates(self):
+        """
+        Index subcatalogs in the MetadataIndex at metadata_index_path.
+
+        Once a subcatalog is indexed, the searches that the index can answer
+        are answered from it (see _search), and it is updated on every reload.
+        """
+        # If the same subcatalog is queued more than once, index it once.
+        for name in dict.fromkeys(_drain(self.index_queue)):
+            try:
+                self._metadata_index.update(name, self._get_subcatalog(name))
+            except Exception:
+                log.exception("Failed to index subcatalog %r.", name)
+
+    def process_histograms(self):
+        """
+        Update the histograms of the start times of runs in subcatalogs and
+        emit the sum of them for the selected subcatalogs.
+
+        They are counted from the MetadataIndex if the subcatalog is indexed,
+        and otherwise updated incrementally with the runs since the last time.
+        """
+        # If there is a backlog, process only the latest request.
+        catalogs = _drain(self.histogram_queue)[-1]
+        total = collections.Counter()
+        for name, catalog in catalogs.items():
+            t0 = time.monotonic()
+            index = self._metadata_index
+            try:
+                if index is not None and index.is_populated(name):
+                    counts = collections.Counter(index.histogram(name, HISTOGRAM_BIN_SIZE))
+                    newest_time = None
+                else:
+                    counts, newest_time = self._histograms.get(
+                        name, (collections.Counter(), None))
+                    query = {} if newest_time is None else {'time': {'$gt': newest_time}}
+                    results = self._search(name, catalog, query,
+                                           {'start': ['uid', 'time'], 'stop': ['uid']})
+                    if isinstance(results, BulkResults):
+                        # MongoDB bins them, in one query.
+                        new_counts, new_newest_time = results.histogram(HISTOGRAM_BIN_SIZE)
+                        counts.update(new_counts)
+                        if new_newest_time is not None:
+                            newest_time = new_newest_time
+                    else:
+                        for _, entry in results.items():
+                            start_time = entry.metadata['start']['time']
+                            counts[start_time // HISTOGRAM_BIN_SIZE * HISTOGRAM_BIN_SIZE] += 1
+                            if newest_time is None or start_time > newest_time:
+                                newest_time = start_time
+            except Exception:
+                log.exception("Failed to count runs in %r by time.", name)
+                continue
+            self._histograms[name] = (counts, newest_time)
+            total.update(counts)
+            duration = time.monotonic() - t0
+            log.debug("Updated histogram of %r (%.3f s).", name, duration)
+        self.histogram_updated.emit(HISTOGRAM_BIN_SIZE, dict(total))
+
+    def process_facets(self):
+        """
+        Count the most common values of each of facet_keys among the results
+        of the newest query, and emit them through facets_updated.
+
+        A key prefixed with 'stop.' is a field of the RunStop document. Where
+        neither the index nor MongoDB can count them, up to MAX_FACET_RUNS
+        results are examined, and the counts are reported as partial.
+        """
+        # If there is a backlog, process only the newer query.
+        generation, catalogs, query = _drain(self.facet_queue)[-1]
+        if generation != self._generation:
+            return
+        t0 = time.monotonic()
+        keys = list(self.facet_keys)
+        start_keys = [key for key in keys if not key.startswith('stop.')]
+        stop_keys = [key[len('stop.'):] for key in keys if key.startswith('stop.')]
+        projection = {'start': sorted(set(start_keys) | {'uid', 'time'}),
+                      'stop': sorted(set(stop_keys) | {'uid'})}
+        counts = {key: collections.Counter() for key in keys}
+        partial = False
+        for name, catalog in catalogs.items():
+            try:
+                results = self._search(name, catalog, query, projection)
+                if hasattr(results, 'value_counts'):
+                    # The index or MongoDB counts them, in one query per key.
+                    for key, counter in counts.items():
+                        counter.update(dict(results.value_counts(key)))
+                    continue
+                for i, (_, entry) in enumerate(results.items()):
+                    if generation != self._generation:
+                        log.debug("Abandoned counting facets of a superseded query.")
+                        return
+                    if i == MAX_FACET_RUNS:
+                        partial = True
+                        break
+                    for key, counter in counts.items():
+                        counter.update(_facet_values(entry.metadata, key))
+            except Exception:
+                log.exception("Failed to count facets in %r.", name)
+        if generation != self._generation:
+            return
+        duration = time.monotonic() - t0
+        log.debug("Counted facets (%.3f s).", duration)
+        self.facets_updated.emit(
+            {key: counter.most_common(FACET_LIMIT) for key, counter in counts.items()},
+            partial)
+
+    def process_counts(self):
+        """
+        Count the results of queries, which can be expensive, apart from
+        paging through them. See show_count.
+        """
+        # If there is a backlog, count only the results of the newer query.
+        for generation, name, catalog in _drain(self.count_queue):
+            if generation != self._generation:
+                continue
+            t0 = time.monotonic()
+            try:
+                count = len(catalog)
+            except Exception:
+                # Leave it uncounted; the rows shown are still reported.
+                log.exception("Failed to count the results from %r.", name)
+                continue
+            duration = time.monotonic() - t0
+            log.debug('Query yielded %r results from %r (%.3f s).', count, name, duration)
+            self.new_count.emit(generation, name, count)
+
+    def process_fetches(self):
+        """
+        Format rows on request, off the Qt main thread.
+
+        The requests are:
+
+        * ('results', generation, (name, iterator)) -- page through results
+        * ('resume', generation, (name, catalog, offset)) -- resume at offset
+        * ('page', generation, None) -- format the next page of all results
+        * ('format', None, row) -- re-format a row evicted from the cache
+        """
+        request, generation, arg = self.fetch_queue.get()
+        if request == 'format':
+            row = arg
+            try:
+                entry = self._lookup_entry(row.uid, row.catalog)
+                self._index_for_filter(row.uid, entry.metadata['start'])
+                row_data, = self.format_entries([entry])
+            except Exception:
+                log.exception("Failed to re-format the row of run %s.", row.uid)
+                # Try again the next time the row is displayed.
+                self._requested_keys.discard(row.key)
+                return
+            self._row_cache[row.key] = row_data or {}
+            self.rows_formatted.emit([row.key])
+            return
+        if generation != self._generation:
+            # A newer search has superseded this one. Don't bother.
+            return
+        if generation != self._results_generation:
+            self._results_generation = generation
+            self._results_iters.clear()
+        if request == 'results':
+            name, iterator = arg
+            self._results_iters[name] = iterator
+            return
+        if request == 'resume':
+            name, catalog, offset = arg
+            try:
+                self._results_iters[name] = itertools.islice(catalog.items(), offset, None)
+            except Exception:
+                log.exception("Failed to resume paging through results of %r.", name)
+                # Stop asking it for more.
+                self.new_rows.emit(generation, [], {name: 0})
+            return
+        t0 = time.monotonic()
+        rows = []
+        num_items = {}
+        for name, iterator in list(self._results_iters.items()):
+            try:
+                page = list(itertools.islice(iterator, FETCH_BATCH_SIZE))
+                rows.extend(self._format_rows(page, generation, name))
+            except Exception:
+                log.exception("Failed to fetch a page of results from %r.", name)
+                # Stop asking it for more.
+                del self._results_iters[name]
+                num_items[name] = 0
+                continue
+            num_items[name] = len(page)
+            if len(page) < FETCH_BATCH_SIZE:
+                del self._results_iters[name]
         duration = time.monotonic() - t0
-        log.debug('Query yielded %r results (%.3f s).',
-                  len(self._results_catalog), duration)
-        self.new_results_catalog.emit()
+        log.debug("Formatted %d results (%.3f s).", len(rows), duration)
+        self.new_rows.emit(generation, rows, num_items)
 
     def search(self):
-        self.search_results_model.clear()
-        self.search_results_model.selected_rows.clear()
-        self._results.clear()
+        """
+        Schedule a search, superseding any that are pending or in flight.
+
+        Searches requested in quick succession (e.g. while typing a custom
+        query) are submitted as one, once there have been no new requests for
+        search_debounce seconds. Each gets a new generation number, and work
+        for older generations is abandoned or ignored.
+        """
+        self._generation += 1
         if not self.enabled:
             return
+        self._search_timer.start(int(1000 * self.search_debounce))
+
+    def _submit_search(self):
+        """
+        Submit the query, or show its results right away if it was run
+        recently and is in the query cache.
+
+        The results of the previous search stay on display until the new ones
+        arrive (see _remove_stale_rows).
+        """
+        if not self.selected_catalogs:
+            # Subcatalogs are still being listed.
+            return
+        # Keep showing the previous results until the new ones arrive.
+        self._stale_rows = {row.uid: row.catalog
+                            for row in self.search_results_model.result_rows()}
+        self._more.clear()
+        self._counts.clear()
+        self._newest_times.clear()
+        self._in_progress.clear()
+        self._empty_reloads = 0
+        self._fetch_pending = False
         query = {'time': {}}
         if self.search_results_model.since is not None:
             query['time']['$gte'] = self.search_results_model.since
         if self.search_results_model.until is not None:
             query['time']['$lt'] = self.search_results_model.until
         query.update(**self.search_results_model.custom_query)
-        self.query_queue.put(query)
+        catalogs = dict(self.selected_catalogs)
+        sort = self._sort
+        key = QueryCache.make_key(self.selected_catalog_name, query, sort)
+        try:
+            cached = self._query_cache[key]
+        except KeyError:
+            cached = None
+        if cached is None or not cached.complete:
+            cached = None
+            sorted_since = None if sort is None else time.time()
+        else:
+            # Look for runs that started since the cached query was run.
+            sorted_since = cached.sorted_since
+        # Update the query before the generation: reload() reads them in the
+        # opposite order, so it can never pair a new generation with an old
+        # query.
+        self._query = query
+        self._sorted_since = sorted_since
+        self._query_cache_key = key
+        self._generation += 1
+        self.facet_queue.put((self._generation, catalogs, query))
+        if cached is None:
+            self._query_cache[key] = CachedResults(catalogs, sorted_since)
+            self.query_queue.put((self._generation, catalogs, query, sort))
+            self.results_status.emit('Searching...')
+            return
+        log.debug('Query %r found in cache.', query)
+        self._more.update(cached.more)
+        self._counts.update(cached.counts)
+        for name, results in cached.catalogs.items():
+            if cached.more[name]:
+                self.fetch_queue.put(
+                    ('resume', self._generation, (name, results, cached.offsets[name])))
+                if name not in cached.counts:
+                    self.count_queue.put((self._generation, name, results))
+        rows = [(row, self.row_data(row)) for row in cached.rows]
+        self._remove_stale_rows(catalogs, rows)
+        self._insert_rows(rows)
+        self._update_status()
+        self.show_results_event.set()
 
-    def show_results(self):
-        header_labels_set = False
-        self.show_results_event.clear()
+    def _cached_results(self):
+        "The cache entry for the displayed query, or None if it has expired"
+        try:
+            return self._query_cache[self._query_cache_key]
+        except KeyError:
+            return None
+
+    def cache_results(self, generation, name, results):
+        if generation != self._generation:
+            return
+        cached = self._cached_results()
+        if cached is not None:
+            cached.catalogs[name] = results
+
+    def show_rows(self, generation, rows, num_items):
+        """
+        Insert a page of formatted rows.
+
+        Parameters
+        ----------
+        generation : int
+        rows : list
+            List of (ResultRow, row_data) pairs
+        num_items : dict
+            Maps subcatalog name to the number of results the page consumed
+        """
+        if generation != self._generation:
+            log.debug("Discarded results from a superseded query.")
+            return
+        self._fetch_pending = False
+        cached = self._cached_results()
+        for name, n in num_items.items():
+            self._more[name] = n == FETCH_BATCH_SIZE
+            if cached is not None:
+                cached.offsets[name] += n
+                cached.more[name] = self._more[name]
+        if cached is not None:
+            cached.rows.extend(row for row, _ in rows)
+        self._remove_stale_rows(num_items, rows)
+        self._insert_rows(rows)
+        self._update_status()
+        self.show_results_event.set()
+
+    def _remove_stale_rows(self, names, rows):
+        """
+        Remove rows from the previous search that came from these subcatalogs
+        (or from none that is selected now) unless they are among rows.
+
+        Rows common to both searches are neither removed nor re-inserted, so
+        they stay selected.
+        """
+        if not self._stale_rows:
+            return
+        fresh = {row.uid for row, _ in rows}
+        stale = []
+        for uid, name in list(self._stale_rows.items()):
+            if name in names or name not in self.selected_catalogs:
+                del self._stale_rows[uid]
+                if uid not in fresh:
+                    stale.append(uid)
+        self.search_results_model.remove_rows(stale)
+
+    def show_new_runs(self, generation, rows):
+        "Merge in runs found by reload()."
+        if generation == self._generation:
+            cached = self._cached_results()
+            if cached is not None:
+                cached.rows.extend(row for row, _ in rows)
+            model = self.search_results_model
+            # Runs shown provisionally were not counted.
+            new_rows = [row for row, _ in rows
+                        if row.uid not in model or model.result_row(row.uid).catalog is None]
+            self._insert_rows(rows)
+            for row in new_rows:
+                if row.catalog in self._counts:
+                    self._counts[row.catalog] += 1
+            self._update_status()
+        else:
+            log.debug("Discarded new runs from a superseded query.")
+        self.show_results_event.set()
+
+    def show_live_run(self, start):
+        """
+        Insert a provisional row for a run announced by a live stream.
+
+        The row is made from the RunStart document alone, without waiting for
+        the catalog. It is shown only if the document matches the query; if
+        that cannot be decided here, the run is left for reload() to find.
+        """
+        self._live_starts[start['uid']] = start
+        while len(self._live_starts) > MAX_LIVE_RUNS:
+            self._live_starts.popitem(last=False)
+        query = self._query
+        if query is None:
+            return
+        try:
+            if not _query_matches(query, start):
+                return
+        except UnsupportedQuery:
+            log.debug("Cannot match run %s to the query locally.", start['uid'])
+            return
+        row = ResultRow(start['uid'], False, start['time'], None)
+        self._index_for_filter(row.uid, start)
+        row_data, = self.format_entries([DocumentEntry(start)])
+        if row_data is None:
+            return
+        self._row_cache[row.key] = row_data
+        self._insert_rows([(row, row_data)])
+        self._update_status()
+
+    def remove_provisional_row(self, uid):
+        "Remove the row shown for a live run that is not in the selected subcatalogs."
+        self._live_starts.pop(uid, None)
+        model = self.search_results_model
+        if uid in model and model.result_row(uid).catalog is None:
+            model.remove_rows([uid])
+            self._update_status()
+
+    def show_run_stop(self, stop):
+        """
+        Refresh the row of a run that the live stream reports has finished.
+
+        If its RunStart document came through the live stream too, the row
+        is re-formatted right away. Otherwise, reload() is poked to look it
+        up in the catalog.
+        """
+        uid = stop['run_start']
+        start = self._live_starts.pop(uid, None)
+        model = self.search_results_model
+        if uid not in model:
+            return
+        old_row = model.result_row(uid)
+        if old_row.has_stop:
+            return
+        if start is None:
+            self.reload_event.set()
+            return
+        row = old_row._replace(has_stop=True)
+        row_data, = self.format_entries([DocumentEntry(start, stop)])
+        if row_data is None:
+            return
+        self._row_cache[row.key] = row_data
+        self._insert_rows([(row, row_data)])
+
+    def show_count(self, generation, name, count):
+        if generation != self._generation:
+            return
+        self._counts[name] = count
+        cached = self._cached_results()
+        if cached is not None:
+            cached.counts[name] = count
+        self._update_status()
+
+    def _update_status(self):
+        # Rows left over from the previous search are not results of this one.
+        num_rows = self.search_results_model.rowCount() - len(self._stale_rows)
+        if self._counts and len(self._counts) == len(self.selected_catalogs):
+            status = f'Showing {num_rows} of {sum(self._counts.values())} results'
+        elif any(self._more.values()):
+            status = f'Showing {num_rows} results (counting...)'
+        else:
+            status = f'{num_rows} results'
+        self.results_status.emit(status)
+
+    def show_formatted_rows(self, keys):
+        "Refresh rows that were re-formatted in the background."
+        self._requested_keys.difference_update(keys)
+        self.search_results_model.refresh_rows(keys)
+
+    def _insert_rows(self, rows):
         t0 = time.monotonic()
-        counter = 0
-        for uid, entry in itertools.islice(self._results_catalog.items(), MAX_SEARCH_RESULTS):
-            if uid in self._results:
+        inserted = self.search_results_model.insert_rows(rows)
+        # Track rows of runs in progress, and the newest run from each
+        # subcatalog, including rows that were already displayed.
+        recent = time.time() - INCOMPLETE_WINDOW
+        for row, _ in rows:
+            if row.catalog is None:
+                # Provisional rows must not hide their run from reload().
                 continue
-            counter += 1
-            self._results.append(uid)
-            row = []
+            if row.has_stop:
+                self._in_progress.pop(row.uid, None)
+            elif row.time > recent:
+                self._in_progress[row.uid] = row.catalog
+            newest_time = self._newest_times.get(row.catalog)
+            if newest_time is None or row.time > newest_time:
+                self._newest_times[row.catalog] = row.time
+        if inserted:
+            duration = time.monotonic() - t0
+            log.debug("Displayed %d new results (%.3f s).", len(inserted), duration)
+        return inserted
+
+    def can_fetch_more(self):
+        return any(self._more.values()) and not self._fetch_pending
+
+    def fetch_more(self):
+        "Request the next page of results."
+        if not self.can_fetch_more():
+            return
+        self._fetch_pending = True
+        self.fetch_queue.put(('page', self._generation, None))
+
+    def row_data(self, row):
+        """
+        Look up the formatted row for a ResultRow.
+
+        If it has been evicted from the cache, return an empty row for now and
+        re-format it in the background. When it is ready, rows_formatted is
+        emitted.
+        """
+        try:
+            return self._row_cache[row.key]
+        except KeyError:
+            self._request_format(row)
+            return {}
+
+    def _request_format(self, row):
+        if row.key not in self._requested_keys:
+            self._requested_keys.add(row.key)
+            self.fetch_queue.put(('format', None, row))
+
+    def _index_for_filter(self, uid, start):
+        self._filter_index.add(uid, filter_text(start, self.filter_fields))
+
+    def set_filter_text(self, text):
+        """
+        Filter the displayed rows by words of their RunStart documents.
+
+        The filter_fields of each RunStart document are indexed in a
+        FilterIndex as rows are formatted, so the catalogs are not searched.
+        """
+        self._filter_index.set_filter(text)
+
+    def filter_active(self):
+        return self._filter_index.active
+
+    def filter_accepts(self, row):
+        "Whether a row passes the quick filter"
+        if self._filter_index.active and row.uid not in self._filter_index:
+            # It was dropped from the index. Re-formatting indexes it again,
+            # and refreshing the row re-applies the filter.
+            self._request_format(row)
+        return self._filter_index.accepts(row.uid)
+
+    def _format_rows(self, items, generation, name):
+        rows = []  # (ResultRow, row_data), where row_data is None until formatted
+        pending = []  # (position in rows, entry) of rows not in the cache
+        for uid, entry in items:
+            if generation != self._generation:
+                log.debug("Abandoned formatting rows of a superseded query.")
+                break
+            start = entry.metadata['start']
+            row = ResultRow(uid, entry.metadata['stop'] is not None, start['time'], name)
+            self._index_for_filter(uid, start)
+            try:
+                rows.append((row, self._row_cache[row.key]))
+            except KeyError:
+                pending.append((len(rows), entry))
+                rows.append((row, None))
+            if len(pending) == FETCH_BATCH_SIZE:
+                self._format_pending(rows, pending)
+        self._format_pending(rows, pending)
+        return [(row, row_data) for row, row_data in rows if row_data is not None]
+
+    def _format_pending(self, rows, pending):
+        formatted = self.format_entries([entry for _, entry in pending])
+        for (i, _), row_data in zip(pending, formatted):
+            if row_data is not None:
+                row, _ = rows[i]
+                self._row_cache[row.key] = row_data
+                rows[i] = (row, row_data)
+        pending.clear()
+
+    def format_entries(self, entries):
+        """
+        Format the rows for a list of entries.
+
+        If search_result_rows is set, it is called once for all of them with
+        a dict like ``{'start': {field: array}, 'stop': {field: array}}``. In
+        numeric columns, missing values (e.g. from runs without a RunStop) are
+        NaN; in others, they are None. If search_result_rows declares its
+        fields with search_result_fields, only those columns are built. It
+        returns a dict mapping column names to sequences of values.
+
+        Returns a list with a dict mapping column names to values for each
+        entry, or None for entries that should not be shown.
+        """
+        if self.search_result_rows is not None and entries:
             try:
-                row_data = self.apply_search_result_row(entry)
+                return self._apply_search_result_rows(entries)
+            except Exception:
+                log.exception("search_result_rows failed. Falling back to search_result_row.")
+        formatted = []
+        for entry in entries:
+            try:
+                formatted.append(self.apply_search_result_row(entry))
             except SkipRow:
-                continue
-            if not header_labels_set:
-                # Set header labels just once.
-                self.search_results_model.setHorizontalHeaderLabels(list(row_data))
-                header_labels_set = True
-            for value in row_data.values():
-                item = QStandardItem()
-                item.setData(value, Qt.DisplayRole)
-                row.append(item)
-            self.search_results_model.appendRow(row)
-        if counter:
-            duration = time.monotonic() - t0
-            log.debug("Displayed %d new results (%.3f s).", counter, duration)
-        self.show_results_event.set()
+                formatted.append(None)
+        return formatted
+
+    def _apply_search_result_rows(self, entries):
+        fields = getattr(self.search_result_rows, 'fields', {})
+        batch = {doc_name: _columns([entry.metadata[doc_name] for entry in entries],
+                                    fields.get(doc_name))
+                 for doc_name in ('start', 'stop')}
+        columns = self.search_result_rows(batch)
+        names = list(columns)
+        values = [_column_values(column) for column in columns.values()]
+        for name, column in zip(names, values):
+            if len(column) != len(entries):
+                raise ValueError(f"Column {name!r} has {len(column)} values for "
+                                 f"{len(entries)} rows.")
+        return [dict(zip(names, row)) for row in zip(*values)]
 
     def reload(self):
+        """
+        Search for runs newer than the newest one displayed.
+
+        Rather than re-running the whole query, ask each subcatalog only for
+        the time range after the newest start['time'] already shown from it,
+        and for the runs shown in progress, by uid, to pick up any RunStops.
+        The results are merged in by show_new_runs().
+
+        If the results are sorted by something other than time, not all of
+        the runs before the newest one shown have been fetched, so look only
+        for runs that started after the query was submitted.
+        """
+        generation = self._generation
+        query = self._query
+        if query is None:
+            return
+        since = self._sorted_since
         t0 = time.monotonic()
-        if self._results_catalog is not None:
-            self._results_catalog.reload()
-            duration = time.monotonic() - t0
-            log.debug("Reloaded search results (%.3f s).", duration)
-            self.new_results_catalog.emit()
+        rows = []
+        catalogs = dict(self.selected_catalogs)
+        in_progress = dict(self._in_progress)
+        for rows_ in self._search_pool.map(
+                functools.partial(self._search_new_runs, generation, query, since, in_progress),
+                catalogs, catalogs.values()):
+            rows.extend(rows_)
+        duration = time.monotonic() - t0
+        log.debug("Searched for new results (%.3f s).", duration)
+        if rows:
+            self._empty_reloads = 0
+        else:
+            self._empty_reloads += 1
+        # New runs may be outside the query's time range.
+        self.histogram_queue.put(catalogs)
+        self.show_results_event.clear()
+        self.new_runs.emit(generation, rows)
+
+    def _search_new_runs(self, generation, query, since, in_progress, name, catalog):
+        try:
+            catalog.reload()
+            index = self._metadata_index
+            if index is not None and index.is_populated(name):
+                index.update(name, catalog)
+            newest_time = self._newest_times.get(name)
+            if since is not None:
+                newest_time = max(since, newest_time or since)
+            if newest_time is not None:
+                query = {'$and': [query, {'time': {'$gt': newest_time}}]}
+            results = self._search(name, catalog, query)
+            rows = self._format_rows(results.items(), generation, name)
+            uids = [uid for uid, name_ in in_progress.items() if name_ == name]
+            if uids:
+                results = self._search(name, catalog, {'uid': {'$in': uids}})
+                finished = ((uid, entry) for uid, entry in results.items()
+                            if entry.metadata['stop'] is not None)
+                rows.extend(self._format_rows(finished, generation, name))
+            return rows
+        except Exception:
+            log.exception("Failed to search subcatalog %r for new runs.", name)
+            return []
 
 
 class CatalogSelectionModel(QStandardItemModel):
@@ -248,9 +1462,25 @@ class CatalogSelectionModel(QStandardItemModel):
     ...
 
 
-class SearchResultsModel(QStandardItemModel):
+class SearchResultsModel(QAbstractTableModel):
     """
     Perform searches on a Catalog and model the results.
+
+    Results are paged in from SearchState as the view scrolls (see
+    canFetchMore and fetchMore). The model holds only a ResultRow for each
+    row; the formatted rows live in the bounded RowCache of SearchState and
+    are re-formatted in the background if evicted.
+
+    Rows are kept in sort order, whichever subcatalog they come from, and
+    rows that arrive later are merged into it. By default, they are ordered
+    by start time, newest first. Sorting by a column (see sort) orders them
+    by the column's values in their formatted rows, or the keys of those
+    that are SortableValues: numbers first, then strings, then missing
+    values. Only the order key of each row is kept (see _order_key). The
+    keys are gathered when sorting and sorted in one go, rather than
+    compared by the view a pair of rows at a time. Indexes from views are
+    mapped back to rows here, and rows are mapped to uids (and back) in
+    constant time.
     """
     selected_result = Signal([list])
     open_entries = Signal([str, list])
@@ -262,24 +1492,306 @@ class SearchResultsModel(QStandardItemModel):
         self.search_state = search_state
         self.since = None
         self.until = None
-        self.selected_rows = set()
+        self.selected_uids = {}  # used as an ordered set
+        self._headers = []
+        self._rows = []  # ResultRows, to support lookup by positional index
+        self._order_keys = []  # _order_key of each of _rows, kept sorted
+        self._positions = {}  # uid -> positional index in _rows
+        self._sort_column = None  # None for the default order
+        self._descending = False  # whether _sort_column is sorted in descending order
+
+    def __contains__(self, uid):
+        return uid in self._positions
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            values = self._row_values(row)
+        elif role == SORT_ROLE:
+            values = _sort_keys(self.search_state.row_data(row))
+        else:
+            return None
+        try:
+            value = values[index.column()]
+        except IndexError:
+            return None
+        if isinstance(value, SortableValue):
+            return value.display
+        return value
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        return self.search_state.can_fetch_more()
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        self.search_state.fetch_more()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Sort by the values of a column, or, if column is -1, by default.
+
+        The rows already loaded are sorted right away. If the catalogs can
+        sort by the column (see SearchState.sort_results), the search is run
+        again, sorted, and its results replace these.
+        """
+        header = self._headers[column] if 0 <= column < len(self._headers) else None
+        self.search_state.sort_results(header, order == Qt.AscendingOrder)
+        self.layoutAboutToBeChanged.emit()
+        self._sort_column = None if column < 0 else column
+        self._descending = self._sort_column is not None and order == Qt.DescendingOrder
+        old_rows = self._rows
+        keys = [self._order_key(row) for row in old_rows]
+        permutation = sorted(range(len(keys)), key=keys.__getitem__)
+        self._rows = [old_rows[i] for i in permutation]
+        self._order_keys = [keys[i] for i in permutation]
+        self._update_positions(0)
+        old_indexes = self.persistentIndexList()
+        new_indexes = [self.index(self._positions[old_rows[index.row()].uid], index.column())
+                       for index in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def insert_rows(self, rows):
+        """
+        Merge rows in, in sort order.
+
+        A row for a uid that is already present replaces it in place if the
+        old row is provisional or is from the same subcatalog, and is skipped
+        otherwise.
+
+        Parameters
+        ----------
+        rows : list
+            List of (ResultRow, row_data) pairs, where row_data is a dict
+            mapping column names to values.
+
+        Returns
+        -------
+        inserted : list
+            The pairs that were inserted
+        """
+        unique_rows = {}
+        last_column = self.columnCount() - 1
+        for row, row_data in rows:
+            if row.uid not in self:
+                unique_rows.setdefault(row.uid, (row, row_data))
+                continue
+            i = self._positions[row.uid]
+            old_row = self._rows[i]
+            if old_row != row and old_row.catalog in (None, row.catalog):
+                self._rows[i] = row
+                self.dataChanged.emit(self.index(i, 0), self.index(i, last_column))
+                # Its sort key may have changed, e.g. its duration.
+                self._reposition(i, row_data)
+        rows = [(row, row_data, self._order_key(row, row_data))
+                for row, row_data in unique_rows.values()]
+        rows.sort(key=operator.itemgetter(2))
+        if not rows:
+            return rows
+        if not self._headers:
+            row_data = next((row_data for _, row_data, _ in rows if row_data), None)
+            if row_data is None:
+                # Rows are being re-formatted in the background.
+                return []
+            self.beginInsertColumns(QModelIndex(), 0, len(row_data) - 1)
+            self._headers = list(row_data)
+            self.endInsertColumns()
+        # Group the rows by where they land, then insert the groups from the
+        # bottom up so that the positions found for the rest stay valid.
+        groups = []
+        for row, _, key in rows:
+            position = bisect.bisect_right(self._order_keys, key)
+            if groups and groups[-1][0] == position:
+                groups[-1][1].append(row)
+                groups[-1][2].append(key)
+            else:
+                groups.append((position, [row], [key]))
+        for position, group, keys in reversed(groups):
+            self.beginInsertRows(QModelIndex(), position, position + len(group) - 1)
+            self._rows[position:position] = group
+            self._order_keys[position:position] = keys
+            self.endInsertRows()
+        self._update_positions(groups[0][0])
+        return [(row, row_data) for row, row_data, _ in rows]
+
+    def _order_key(self, row, row_data=None):
+        """
+        The key that rows are kept in ascending order of
+
+        Only the key of the column being sorted by is looked up, in row_data
+        or, by default, in the formatted row cached by SearchState.
+        """
+        if self._sort_column is None:
+            # newest first
+            return -row.time
+        if not row_data:
+            row_data = self.search_state.row_data(row)
+        try:
+            value = list(row_data.values())[self._sort_column]
+        except IndexError:
+            value = None
+        if isinstance(value, SortableValue):
+            value = value.key
+        # Whichever the direction, missing values go last and ties are broken
+        # by start time, newest first.
+        if isinstance(value, numbers.Real) and not math.isnan(value):
+            return (0, -value if self._descending else value, -row.time)
+        if value is None or isinstance(value, numbers.Real):
+            return (2, 0, -row.time)
+        value = str(value)
+        return (1, _Descending(value) if self._descending else value, -row.time)
+
+    def _reposition(self, i, row_data=None):
+        "Move the row at i to where its order key now belongs."
+        row = self._rows[i]
+        key = self._order_key(row, row_data)
+        if key == self._order_keys[i]:
+            return
+        del self._order_keys[i]
+        j = bisect.bisect_right(self._order_keys, key)
+        if j == i:
+            self._order_keys.insert(i, key)
+            return
+        self.beginMoveRows(QModelIndex(), i, i, QModelIndex(), j if j < i else j + 1)
+        del self._rows[i]
+        self._rows.insert(j, row)
+        self._order_keys.insert(j, key)
+        self.endMoveRows()
+        self._update_positions(min(i, j))
+
+    def remove_rows(self, uids):
+        "Remove the rows for these uids, where present."
+        positions = sorted((self._positions[uid] for uid in uids if uid in self._positions),
+                           reverse=True)
+        if not positions:
+            return
+        # Remove contiguous ranges from the bottom up, so the positions of the
+        # rest stay valid.
+        ranges = []
+        for i in positions:
+            if ranges and ranges[-1][0] == i + 1:
+                ranges[-1][0] = i
+            else:
+                ranges.append([i, i])
+        for first, last in ranges:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for row in self._rows[first:last + 1]:
+                del self._positions[row.uid]
+            del self._rows[first:last + 1]
+            del self._order_keys[first:last + 1]
+            self.endRemoveRows()
+        self._update_positions(ranges[-1][0])
+        deselected = [uid for uid in uids if uid in self.selected_uids]
+        if deselected:
+            for uid in deselected:
+                del self.selected_uids[uid]
+            self._emit_selected_entries()
+
+    def result_row(self, uid):
+        return self._rows[self._positions[uid]]
+
+    def result_rows(self):
+        return list(self._rows)
+
+    def refresh_rows(self, keys):
+        "Notify views that these rows have been (re-)formatted."
+        last_column = self.columnCount() - 1
+        for uid, has_stop in keys:
+            i = self._positions.get(uid)
+            if i is not None and self._rows[i].has_stop == has_stop:
+                self.dataChanged.emit(self.index(i, 0), self.index(i, last_column))
+                if self._sort_column is not None:
+                    # It may have been sorted without its sort key.
+                    self._reposition(i)
+
+    def filter_accepts_row(self, row):
+        return self.search_state.filter_accepts(self._rows[row])
+
+    def uid_at(self, row):
+        return self._rows[row].uid
+
+    def row_of(self, uid):
+        return self._positions[uid]
+
+    def uid_from_index(self, index):
+        "Map an index from a view, possibly through proxy models, to a uid."
+        model = index.model()
+        while model is not self:
+            index = model.mapToSource(index)
+            model = index.model()
+        return self.uid_at(index.row())
+
+    def _rows_near(self, index, distance):
+        """
+        The ResultRows within distance of index, nearest first, in the order
+        of the (possibly proxy) model that index belongs to.
+        """
+        model = index.model()
+        num_rows = model.rowCount()
+        rows = []
+        for offset in range(1, distance + 1):
+            for i in (index.row() + offset, index.row() - offset):
+                if 0 <= i < num_rows:
+                    rows.append(self.result_row(self.uid_from_index(model.index(i, 0))))
+        return rows
+
+    def _update_positions(self, start):
+        for i in range(start, len(self._rows)):
+            self._positions[self._rows[i].uid] = i
+
+    def _row_values(self, row):
+        return tuple(self.search_state.row_data(row).values())
 
     def emit_selected_result(self, selected, deselected):
-        self.selected_rows |= set(index.row() for index in selected.indexes())
-        self.selected_rows -= set(index.row() for index in deselected.indexes())
+        for index in selected.indexes():
+            self.selected_uids[self.uid_from_index(index)] = None
+        for index in deselected.indexes():
+            self.selected_uids.pop(self.uid_from_index(index), None)
+        self._emit_selected_entries()
+        indexes = selected.indexes()
+        if indexes:
+            self.search_state.prefetch(self._rows_near(indexes[-1], PREFETCH_DISTANCE))
+
+    def _emit_selected_entries(self):
         entries = []
-        for row in sorted(self.selected_rows):
-            uid = self.search_state._results[row]
-            entry = self.search_state._results_catalog[uid]
+        for uid in self.selected_uids:
+            try:
+                entry = self.search_state.get_entry(self.result_row(uid))
+            except KeyError:
+                log.debug("Run %s is not in the catalog yet.", uid)
+                continue
             entries.append(entry)
         self.selected_result.emit(entries)
 
     def emit_open_entries(self, target, indexes):
-        rows = set(index.row() for index in indexes)
+        uids = dict.fromkeys(self.uid_from_index(index) for index in indexes)
         entries = []
-        for row in rows:
-            uid = self.search_state._results[row]
-            entry = self.search_state._results_catalog[uid]
+        for uid in uids:
+            try:
+                entry = self.search_state.get_entry(self.result_row(uid))
+            except KeyError:
+                log.debug("Run %s is not in the catalog yet.", uid)
+                continue
             entries.append(entry)
         self.open_entries.emit(target, entries)
 
@@ -301,6 +1813,31 @@ class SearchResultsModel(QStandardItemModel):
         self.search_state.search()
 
 
+class SearchResultsProxyModel(QSortFilterProxyModel):
+    """
+    Quick-filter SearchResultsModel for display.
+
+    Sorting is handed to SearchResultsModel, which keeps an order key per
+    row, much faster than comparing rows from here would be.
+    While a quick filter is set, more results are not fetched: it narrows
+    down the results that are already loaded.
+    """
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+    def set_filter_text(self, text):
+        self.sourceModel().search_state.set_filter_text(text)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self.sourceModel().filter_accepts_row(source_row)
+
+    def canFetchMore(self, parent):
+        if self.sourceModel().search_state.filter_active():
+            return False
+        return super().canFetchMore(parent)
+
+
 class SearchInputWidget(QWidget):
     """
     Input fields for specifying searches on SearchResultsModel
@@ -316,6 +1853,13 @@ class SearchInputWidget(QWidget):
         search_bar_layout.addWidget(mongo_query_help_button)
         mongo_query_help_button.clicked.connect(self.show_mongo_query_help)
 
+        self.filter_bar = QLineEdit()
+        self.filter_bar.setPlaceholderText('Narrow down the results below')
+        self.filter_bar.setClearButtonEnabled(True)
+        filter_bar_layout = QHBoxLayout()
+        filter_bar_layout.addWidget(QLabel('Filter:'))
+        filter_bar_layout.addWidget(self.filter_bar)
+
         self.since_widget = QDateTimeEdit()
         self.since_widget.setCalendarPopup(True)
         self.since_widget.setDisplayFormat('yyyy-MM-dd HH:mm')
@@ -330,12 +1874,31 @@ class SearchInputWidget(QWidget):
         until_layout.addWidget(QLabel('Until:'))
         until_layout.addWidget(self.until_widget)
 
+        self.timeline_widget = TimelineWidget()
+        self.timeline_widget.range_selected.connect(self.set_time_range)
+
         layout = QVBoxLayout()
         layout.addLayout(since_layout)
         layout.addLayout(until_layout)
+        layout.addWidget(self.timeline_widget)
         layout.addLayout(search_bar_layout)
+        layout.addLayout(filter_bar_layout)
         self.setLayout(layout)
 
+    def refine_query(self, key, value):
+        "Add a condition to the custom query, unless it is being edited into shape."
+        text = self.search_bar.text()
+        try:
+            query = dict(ast.literal_eval(text)) if text else {}
+        except Exception:
+            return
+        query[key] = value
+        self.search_bar.setText(repr(query))
+
+    def set_time_range(self, since, until):
+        self.since_widget.setDateTime(QDateTime.fromSecsSinceEpoch(int(since)))
+        self.until_widget.setDateTime(QDateTime.fromSecsSinceEpoch(int(until)))
+
     def mark_custom_query(self, valid):
         "Indicate whether the current text is a parsable query."
         if valid:
@@ -355,12 +1918,133 @@ Examples:
 {'plan_name': 'scan'}
 {'proposal': 1234},
 {'$and': ['proposal': 1234, 'sample_name': 'Ni']}
+{'$text': {'$search': 'Ni'}}  (text search)
 """)
         msg.setWindowTitle("Custom Mongo Query")
         msg.setStandardButtons(QMessageBox.Ok)
         msg.exec_()
 
 
+class FacetWidget(QTreeWidget):
+    """
+    The most common values of some fields among the search results
+
+    Clicking a value emits facet_selected, to refine the query. Fields of the
+    RunStop document cannot be queried, so their values are not clickable.
+    """
+    facet_selected = Signal([str, object])
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setHeaderLabels(['Field', 'Runs'])
+        self.setMaximumHeight(160)
+        self.itemClicked.connect(self._on_item_clicked)
+
+    def set_facets(self, facets, partial):
+        """
+        Parameters
+        ----------
+        facets : dict
+            Maps each field to a list of (value, count) pairs
+        partial : bool
+            Whether the counts are lower bounds
+        """
+        self.clear()
+        for key, values in facets.items():
+            parent = QTreeWidgetItem(self, [key, ''])
+            for value, count in values:
+                item = QTreeWidgetItem(parent, [str(value), f'{count}+' if partial else str(count)])
+                item.setData(0, Qt.UserRole, value)
+                item.setDisabled(key.startswith('stop.'))
+            parent.setExpanded(True)
+
+    def _on_item_clicked(self, item, column):
+        parent = item.parent()
+        if parent is None or item.isDisabled():
+            return
+        self.facet_selected.emit(parent.text(0), item.data(0, Qt.UserRole))
+
+
+class TimelineWidget(QWidget):
+    """
+    Bar chart of the number of runs over time
+
+    Each bar covers the runs that started within its time range. Clicking a
+    bar emits its range.
+    """
+    range_selected = Signal([float, float])
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setMinimumHeight(40)
+        self.setMouseTracking(True)
+        self._bin_size = 1
+        self._counts = {}  # start of bin -> number of runs
+
+    def set_histogram(self, bin_size, counts):
+        self._bin_size = bin_size
+        self._counts = counts
+        self.update()
+
+    def _columns(self):
+        """
+        Group the bins into at most one column per pixel.
+
+        Returns the start time and duration of the first column, and the
+        number of runs in each column.
+        """
+        first = min(self._counts)
+        num_bins = int((max(self._counts) - first) // self._bin_size) + 1
+        num_columns = min(num_bins, max(1, self.width()))
+        column_size = self._bin_size * -(-num_bins // num_columns)
+        num_columns = -(-num_bins * self._bin_size // column_size)
+        columns = [0] * int(num_columns)
+        for start, count in self._counts.items():
+            columns[int((start - first) // column_size)] += count
+        return first, column_size, columns
+
+    def _column_at(self, x):
+        "The time range of the column at x, or None if there is nothing there"
+        if not self._counts:
+            return None
+        first, column_size, columns = self._columns()
+        i = int(x * len(columns) / max(1, self.width()))
+        if not 0 <= i < len(columns) or not columns[i]:
+            return None
+        return first + i * column_size, first + (i + 1) * column_size, columns[i]
+
+    def paintEvent(self, event):
+        if not self._counts:
+            return
+        first, column_size, columns = self._columns()
+        width = self.width() / len(columns)
+        height = self.height()
+        tallest = max(columns)
+        painter = QPainter(self)
+        color = self.palette().highlight().color()
+        for i, count in enumerate(columns):
+            if count:
+                bar_height = max(1, height * count / tallest)
+                painter.fillRect(QRectF(i * width, height - bar_height,
+                                        max(1, width - 1), bar_height), color)
+
+    def mouseMoveEvent(self, event):
+        column = self._column_at(event.x())
+        if column is None:
+            self.setToolTip('')
+            return
+        since, until, count = column
+        since, until = (datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M')
+                        for t in (since, until))
+        self.setToolTip(f'{since} to {until}: {count} runs')
+
+    def mousePressEvent(self, event):
+        column = self._column_at(event.x())
+        if column is not None:
+            since, until, _ = column
+            self.range_selected.emit(since, until)
+
+
 class CatalogList(QComboBox):
     """
     List of subcatalogs
@@ -375,9 +2059,11 @@ class CatalogSelectionWidget(QWidget):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.catalog_list = CatalogList()
+        self.refresh_button = QPushButton('Refresh')
         layout = QHBoxLayout()
         layout.addWidget(QLabel("Catalog:"))
         layout.addWidget(self.catalog_list)
+        layout.addWidget(self.refresh_button)
         self.setLayout(layout)
 
 
@@ -400,19 +2086,327 @@ class SearchWidget(QWidget):
     """
     Search input and results list
     """
+    visibility_changed = Signal([bool])
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.catalog_selection_widget = CatalogSelectionWidget()
         self.search_input_widget = SearchInputWidget()
+        self.facet_widget = FacetWidget()
         self.search_results_widget = SearchResultsWidget()
+        self.search_results_status = QLabel()
 
         layout = QVBoxLayout()
         layout.addWidget(self.catalog_selection_widget)
         layout.addWidget(self.search_input_widget)
+        layout.addWidget(self.facet_widget)
         layout.addWidget(self.search_results_widget)
+        layout.addWidget(self.search_results_status)
         self.setLayout(layout)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.visibility_changed.emit(True)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.visibility_changed.emit(False)
+
+
+class RowCache:
+    """
+    A thread-safe LRU cache of formatted search result rows.
+
+    It is bounded both in the number of rows and in their approximate size in
+    memory. Keys are (uid, has_stop), so that a row formatted while its run
+    was in progress is not reused once the run has a RunStop document.
+    """
+    def __init__(self, max_rows, max_bytes):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._rows = collections.OrderedDict()  # key -> (row_data, nbytes)
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, key):
+        with self._lock:
+            row_data, _ = self._rows[key]
+            self._rows.move_to_end(key)
+            return row_data
+
+    def __setitem__(self, key, row_data):
+        nbytes = sys.getsizeof(row_data) + sum(
+            sys.getsizeof(value) for value in row_data.values())
+        with self._lock:
+            if key in self._rows:
+                _, old_nbytes = self._rows.pop(key)
+                self._nbytes -= old_nbytes
+            self._rows[key] = (row_data, nbytes)
+            self._nbytes += nbytes
+            while self._rows and (len(self._rows) > self.max_rows or
+                                  self._nbytes > self.max_bytes):
+                _, (_, old_nbytes) = self._rows.popitem(last=False)
+                self._nbytes -= old_nbytes
+
+
+class EntryCache:
+    """
+    A thread-safe LRU cache of catalog entries
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            return entry
+
+    def __setitem__(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class CachedEntry:
+    """
+    Wraps a catalog entry, instantiating its datasource once and reusing it
+    """
+    def __init__(self, entry):
+        self.entry = entry
+        self._datasource = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            if self._datasource is None:
+                self._datasource = self.entry()
+            return self._datasource
+
+    def __getattr__(self, name):
+        return getattr(self.entry, name)
+
+    def warm(self):
+        "Instantiate the datasource and read its metadata and list of streams."
+        datasource = self()
+        # Listing the streams reads the EventDescriptors.
+        streams = list(datasource)
+        log.debug("Prefetched run %s with streams %r.",
+                  datasource.metadata['start']['uid'], streams)
+
+
+class CachedResults:
+    """
+    The results of a query on one or more subcatalogs, and how far through
+    them the model has paged
+    """
+    def __init__(self, subcatalogs, sorted_since=None):
+        # when the query was run, if sorted by something other than time
+        self.sorted_since = sorted_since
+        # These map subcatalog name to...
+        self.catalogs = {}  # the results catalog, once the query has been run
+        self.offsets = dict.fromkeys(subcatalogs, 0)  # items consumed from it
+        self.more = dict.fromkeys(subcatalogs, True)  # whether there are more
+        self.counts = {}  # len(results catalog), once counted
+        self.rows = []  # ResultRows displayed
+
+    @property
+    def complete(self):
+        "Whether every subcatalog has answered the query"
+        return len(self.catalogs) == len(self.offsets)
+
+
+class QueryCache:
+    """
+    A thread-safe cache of CachedResults keyed on (subcatalog name, query).
+
+    Entries expire after ttl seconds, and the least recently used entries are
+    evicted beyond max_size.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()  # key -> (time, CachedResults)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name, query, sort=None):
+        "Make a key that does not depend on the order of items in the query."
+        return (name, json.dumps(query, sort_keys=True, default=repr), repr(sort))
+
+    def __getitem__(self, key):
+        with self._lock:
+            t, cached = self._entries[key]
+            if time.monotonic() - t > self.ttl:
+                del self._entries[key]
+                raise KeyError(key)
+            self._entries.move_to_end(key)
+            return cached
+
+    def __setitem__(self, key, cached):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), cached)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_COMPARISONS = {'$gt': operator.gt, '$gte': operator.ge, '$lt': operator.lt, '$lte': operator.le}
+
+
+def _columns(docs, fields=None):
+    """
+    Transpose documents (or None, for missing documents) into a dict mapping
+    each field (by default, all fields) to a NumPy array of values.
+
+    Columns of numbers are numeric arrays, with NaN for missing values, and
+    columns with no values at all are all NaN. Other columns are arrays of
+    objects, with None for missing values.
+    """
+    if fields is None:
+        fields = dict.fromkeys(field for doc in docs if doc is not None for field in doc)
+    columns = {}
+    for field in fields:
+        values = [None if doc is None else doc.get(field) for doc in docs]
+        present = [value for value in values if value is not None]
+        if not present:
+            columns[field] = numpy.full(len(values), numpy.nan)
+        elif all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                 for value in present):
+            if len(present) == len(values):
+                columns[field] = numpy.array(values)
+            else:
+                columns[field] = numpy.array(
+                    [numpy.nan if value is None else value for value in values], dtype=float)
+        else:
+            column = numpy.empty(len(values), dtype=object)
+            for i, value in enumerate(values):
+                column[i] = value
+            columns[field] = column
+    return columns
+
+
+def _drain(request_queue):
+    "Wait for a request, then take any queued behind it too, oldest first."
+    requests = [request_queue.get()]
+    while True:
+        try:
+            requests.append(request_queue.get_nowait())
+        except queue.Empty:
+            return requests
+
+
+def _search_parameters(catalog):
+    "The names of the parameters of catalog.search"
+    try:
+        return inspect.signature(catalog.search).parameters
+    except (TypeError, ValueError):
+        return {}
+
+
+def _column_values(column):
+    "Make a list of the values in a column returned by search_result_rows."
+    if isinstance(column, SortableValue):
+        # NaN would leave the column out of order; sort missing keys last.
+        keys = [None if key != key else key for key in _column_values(column.key)]
+        return list(map(SortableValue, _column_values(column.display), keys))
+    if isinstance(column, numpy.ndarray):
+        return column.tolist()
+    return list(column)
+
+
+@functools.total_ordering
+class _Descending:
+    "Wrap a value to compare in reverse."
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _sort_keys(row_data):
+    "The SORT_ROLE data of each column of a formatted row"
+    return tuple(value.key if isinstance(value, SortableValue) else value
+                 for value in row_data.values())
+
+
+def _facet_values(metadata, key):
+    """
+    The values of a field of a run, for counting. A key prefixed with 'stop.'
+    is a field of the RunStop document. Each element of an array counts.
+    """
+    if key.startswith('stop.'):
+        doc = metadata['stop'] or {}
+        key = key[len('stop.'):]
+    else:
+        doc = metadata['start']
+    value = doc.get(key)
+    values = value if isinstance(value, list) else [value]
+    return [value for value in values if isinstance(value, (str, int, float))]
+
+
+def _query_matches(query, doc):
+    """
+    Whether a document matches a Mongo-style query.
+
+    Only comparisons, $in, $and and $or are supported. Like in Mongo, a value
+    also matches the elements of an array.
+
+    Raises
+    ------
+    UnsupportedQuery
+        If the query uses anything else
+    """
+    for key, value in query.items():
+        if key == '$and':
+            if not all(_query_matches(subquery, doc) for subquery in value):
+                return False
+        elif key == '$or':
+            if not any(_query_matches(subquery, doc) for subquery in value):
+                return False
+        elif key.startswith('$'):
+            raise UnsupportedQuery(key)
+        else:
+            if not isinstance(value, dict):
+                value = {'$eq': value}
+            field = doc.get(key)
+            candidates = field if isinstance(field, list) else [field]
+            for op, operand in value.items():
+                if op == '$eq':
+                    match = field == operand or operand in candidates
+                elif op == '$ne':
+                    match = field != operand and operand not in candidates
+                elif op == '$in':
+                    match = any(candidate in operand for candidate in candidates)
+                elif op in _COMPARISONS:
+                    try:
+                        match = field is not None and _COMPARISONS[op](field, operand)
+                    except TypeError:
+                        match = False
+                else:
+                    raise UnsupportedQuery(op)
+                if not match:
+                    return False
+    return True
+
 
 class SkipRow(Exception):
     ...
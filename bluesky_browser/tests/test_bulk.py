@@ -0,0 +1,93 @@
+from ..bulk import BulkResults
+
+
+class Collection:
+    "Just enough of a pymongo Collection, counting queries"
+    def __init__(self, name, docs):
+        self.name = name
+        self.docs = docs
+        self.queries = 0
+        self.pipelines = []
+        self.groups = []  # returned by aggregate
+
+    def find(self, query, projection, sort=None, batch_size=None):
+        self.queries += 1
+        docs = self.docs
+        if 'run_start' in query:
+            docs = [doc for doc in docs if doc['run_start'] in query['run_start']['$in']]
+        if sort is not None:
+            (key, direction), = sort
+            docs = sorted(docs, key=lambda doc: doc[key], reverse=direction < 0)
+        return iter([{key: value for key, value in doc.items()
+                      if projection.get(key, len(projection) == 1)}
+                     for doc in docs])
+
+    def count_documents(self, query):
+        return len(self.docs)
+
+    def aggregate(self, pipeline):
+        self.queries += 1
+        self.pipelines.append(pipeline)
+        return iter(self.groups)
+
+
+class Results:
+    def __init__(self, n):
+        starts = [{'_id': i, 'uid': f'uid{i}', 'time': i, 'plan_name': 'scan'} for i in range(n)]
+        stops = [{'_id': i, 'uid': f'stop{i}', 'run_start': f'uid{i}', 'exit_status': 'success'}
+                 for i in range(n) if i % 3]
+        self._run_start_collection = Collection('run_start', starts)
+        self._run_stop_collection = Collection('run_stop', stops)
+        self._query = {}
+
+
+def test_pages():
+    results = Results(25)
+    assert BulkResults.supports(results)
+    assert not BulkResults.supports(object())
+    bulk = BulkResults(results, 10, {'start': ['uid', 'time'], 'stop': None})
+    assert len(bulk) == 25
+    items = list(bulk.items())
+    assert [uid for uid, _ in items] == [f'uid{i}' for i in range(24, -1, -1)]
+    # One query for the RunStarts and one for the RunStops of each page
+    assert results._run_start_collection.queries == 1
+    assert results._run_stop_collection.queries == 3
+    _, entry = items[0]
+    assert entry.metadata == {'start': {'uid': 'uid24', 'time': 24}, 'stop': None}
+    _, entry = items[1]
+    assert entry.describe()['metadata']['stop']['exit_status'] == 'success'
+    assert '_id' not in entry.metadata['stop']
+
+
+def test_sort():
+    results = Results(5)
+    bulk = BulkResults(results, 2, sort=[('time', 1)])
+    assert [uid for uid, _ in bulk.items()] == [f'uid{i}' for i in range(5)]
+
+
+def test_value_counts():
+    results = Results(5)
+    bulk = BulkResults(results, 2)
+    results._run_start_collection.groups = [{'_id': 'success', 'count': 3},
+                                            {'_id': {'nested': 1}, 'count': 2}]
+    # Values that are documents are left out.
+    assert bulk.value_counts('stop.exit_status') == [('success', 3)]
+    assert results._run_start_collection.queries == 1
+    assert results._run_stop_collection.queries == 0
+    pipeline, = results._run_start_collection.pipelines
+    assert pipeline[2]['$lookup']['from'] == 'run_stop'
+    assert pipeline[4] == {'$project': {'_id': False, 'value': '$stop.exit_status'}}
+    bulk.value_counts('plan_name')
+    assert results._run_start_collection.pipelines[1][1] == {
+        '$project': {'_id': False, 'value': '$plan_name'}}
+
+
+def test_histogram():
+    results = Results(5)
+    bulk = BulkResults(results, 2)
+    assert bulk.histogram(10) == ({}, None)
+    results._run_start_collection.groups = [{'_id': 0, 'count': 3, 'newest': 7.5},
+                                            {'_id': 20, 'count': 1, 'newest': 21}]
+    assert bulk.histogram(10) == ({0: 3, 20: 1}, 21)
+    assert results._run_start_collection.queries == 2
+    assert results._run_stop_collection.queries == 0
@@ -0,0 +1,39 @@
+from ..filter_index import FilterIndex, filter_text
+
+
+def test_filter_text():
+    start = {'uid': 'abc', 'scan_id': 3, 'detectors': ['det1', 'det2'],
+             'sample': {'name': 'Ni oxide'}, 'note': None, 'dry_run': False}
+    assert filter_text(start).split('\n') == ['abc', '3', 'det1', 'det2', 'Ni oxide']
+    assert filter_text(start, ['scan_id', 'nonexistent']) == '3'
+
+
+def test_filter():
+    index = FilterIndex(3)
+    index.add('uid0', 'Ni oxide\nscan')
+    index.add('uid1', 'Cu\nscan')
+    assert not index.active
+    assert index.accepts('uid0') and index.accepts('nonexistent')
+
+    index.set_filter('NI')
+    assert index.active
+    assert index.accepts('uid0') and not index.accepts('uid1')
+    index.set_filter('oxide scan')
+    assert index.accepts('uid0') and not index.accepts('uid1')
+    index.set_filter('scan  cu')
+    assert not index.accepts('uid0') and index.accepts('uid1')
+
+    # Runs added while filtering are checked as they arrive.
+    index.add('uid2', 'Cu oxide\nscan')
+    assert index.accepts('uid2')
+    index.add('uid1', 'Fe\nscan')
+    assert not index.accepts('uid1')
+
+    # The first run added is discarded once there are more than 3.
+    index.add('uid3', 'Cu\nscan')
+    assert len(index) == 3 and 'uid0' not in index
+    index.set_filter('ni')
+    assert not index.accepts('uid0')
+
+    index.set_filter('')
+    assert not index.active and index.accepts('uid1')
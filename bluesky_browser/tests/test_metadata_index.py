@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+
+from .. import metadata_index
+from ..metadata_index import MetadataIndex, UnsupportedQuery
+from .test_bulk import Results as MongoResults
+
+
+class Entry:
+    def __init__(self, start, stop):
+        self.metadata = {'start': start, 'stop': stop}
+
+
+class Catalog:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def items(self):
+        for entry in self.entries:
+            yield entry.metadata['start']['uid'], entry
+
+
+@pytest.fixture
+def index(tmp_path):
+    entries = []
+    for i in range(10):
+        start = {'uid': f'uid{i}', 'time': 1000 + i, 'scan_id': i,
+                 'plan_name': 'scan' if i % 2 else 'count',
+                 'detectors': ['det', f'det{i}'],
+                 'sample': 'Ni oxide' if i < 3 else 'Cu'}
+        stop = {'uid': f'stop{i}', 'run_start': f'uid{i}', 'time': 1001 + i,
+                'exit_status': 'success'}
+        entries.append(Entry(start, None if i == 9 else stop))
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    index.update('abc', Catalog(entries))
+    return index
+
+
+def scan_ids(results):
+    return [run.metadata['start']['scan_id'] for _, run in results.items()]
+
+
+def test_search(index):
+    assert index.is_populated('abc')
+    assert not index.is_populated('xyz')
+    assert scan_ids(index.search('abc', {})) == list(range(9, -1, -1))
+    assert scan_ids(index.search('abc', {'time': {'$gte': 1005, '$lt': 1007}})) == [6, 5]
+    assert scan_ids(index.search('abc', {'plan_name': 'scan', 'scan_id': {'$lt': 4}})) == [3, 1]
+    assert scan_ids(index.search('abc', {'detectors': 'det4'})) == [4]
+    assert scan_ids(index.search('abc', {'$or': [{'scan_id': 1}, {'scan_id': 8}]})) == [8, 1]
+    assert len(index.search('abc', {'sample': {'$in': ['Cu']}})) == 7
+    assert len(index.search('xyz', {})) == 0
+    # Field names are not interpolated into SQL.
+    assert scan_ids(index.search('abc', {"it's": 'x'})) == []
+    assert scan_ids(index.search('abc', {"it's": {'$gt': 'x'}})) == []
+
+
+def test_sort(index, monkeypatch):
+    monkeypatch.setattr(metadata_index, 'PAGE_SIZE', 3)
+    assert scan_ids(index.search('abc', {})) == list(range(9, -1, -1))
+    assert scan_ids(index.search('abc', {}, sort=[('scan_id', 1)])) == list(range(10))
+    assert scan_ids(index.search('abc', {'scan_id': {'$gt': 2}},
+                                 sort=[('time', 1)])) == list(range(3, 10))
+    # Ties are broken by uid.
+    assert scan_ids(index.search('abc', {}, sort=[('plan_name', -1)])) == [9, 7, 5, 3, 1,
+                                                                           8, 6, 4, 2, 0]
+    with pytest.raises(UnsupportedQuery):
+        index.search('abc', {}, sort=[('sample', 1)])
+
+
+def test_items_across_threads(index, monkeypatch):
+    monkeypatch.setattr(metadata_index, 'PAGE_SIZE', 3)
+    iterator = iter(index.search('abc', {}).items())
+    first_page = [next(iterator) for _ in range(3)]
+    rest = []
+    thread = threading.Thread(target=lambda: rest.extend(iterator))
+    thread.start()
+    thread.join()
+    assert len(first_page) + len(rest) == 10
+
+
+class MongoCatalog(MongoResults):
+    def search(self, query):
+        results = MongoCatalog(0)
+        results.__dict__.update(self.__dict__, _query=query)
+        return results
+
+
+def test_update_mongo(index, monkeypatch):
+    monkeypatch.setattr(metadata_index, 'PAGE_SIZE', 10)
+    catalog = MongoCatalog(25)
+    index.update('mongo', catalog)
+    assert len(index.search('mongo', {})) == 25
+    # One query for the RunStarts and one for the RunStops of each page
+    assert catalog._run_start_collection.queries == 1
+    assert catalog._run_stop_collection.queries == 3
+    index.update('mongo', catalog)
+    assert catalog._run_start_collection.queries == 2
+    assert catalog._run_stop_collection.queries == 6
+
+
+def test_histogram(index):
+    assert index.histogram('abc', 4) == {1000: 4, 1004: 4, 1008: 2}
+    assert index.histogram('xyz', 4) == {}
+
+
+def test_value_counts(index):
+    results = index.search('abc', {'scan_id': {'$lt': 5}})
+    assert results.value_counts('plan_name') == [('count', 3), ('scan', 2)]
+    assert results.value_counts('detectors')[0] == ('det', 5)
+    assert len(results.value_counts('detectors')) == 6
+    assert results.value_counts('stop.exit_status') == [('success', 5)]
+    assert index.search('abc', {}).value_counts('stop.exit_status') == [('success', 9)]
+    assert results.value_counts('nonexistent') == []
+
+
+def test_full_text_search(index):
+    if not index.full_text:
+        pytest.skip("SQLite was built without FTS5")
+    assert scan_ids(index.search('abc', {'$text': {'$search': 'oxide'}})) == [2, 1, 0]
+
+
+def test_stop_documents(index):
+    results = index.search('abc', {})
+    assert results['uid9'].metadata['stop'] is None
+    assert results['uid8'].describe()['metadata']['stop']['exit_status'] == 'success'
+
+
+def test_unsupported_query(index):
+    with pytest.raises(UnsupportedQuery):
+        index.search('abc', {'$where': 'this.scan_id > 1'})
+    with pytest.raises(UnsupportedQuery):
+        index.search('abc', {'scan_id': {'$regex': '1'}})
+    # Mongo matches documents without the field for these.
+    with pytest.raises(UnsupportedQuery):
+        index.search('abc', {'plan_name': {'$ne': 'scan'}})
+    with pytest.raises(UnsupportedQuery):
+        index.search('abc', {'sample': None})
+    with pytest.raises(UnsupportedQuery):
+        index.search('abc', {'sample': {'$in': ['Cu', None]}})
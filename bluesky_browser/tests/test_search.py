@@ -0,0 +1,275 @@
+import math
+import queue
+import threading
+import types
+
+import numpy
+import pytest
+from qtpy.QtCore import Qt
+
+from .. import search
+from ..search import (MAX_RELOAD_INTERVAL, NEW_RUN_RETRY_DELAYS, RELOAD_INTERVAL,
+                      CachedResults, QueryCache, ResultRow, RowCache, SearchResultsModel,
+                      SearchState, SortableValue, UnsupportedQuery, _columns, _query_matches)
+
+
+class ModelSearchState:
+    "Just enough of a SearchState for SearchResultsModel, without threads"
+    def __init__(self):
+        self.row_cache = {}
+        self.sorted_by = []
+
+    def row_data(self, row):
+        return self.row_cache.get(row.key, {})
+
+    def sort_results(self, column, ascending):
+        self.sorted_by.append((column, ascending))
+
+    def can_fetch_more(self):
+        return False
+
+
+def make_row(search_state, uid, time, duration=None, catalog='abc'):
+    row = ResultRow(uid, duration is not None, time, catalog)
+    display = '-' if duration is None else f'{duration} s'
+    row_data = {'Unique ID': uid, 'Duration': SortableValue(display, duration)}
+    search_state.row_cache[row.key] = row_data
+    return row, row_data
+
+
+def uids(model):
+    return [model.uid_at(i) for i in range(model.rowCount())]
+
+
+@pytest.fixture
+def model():
+    return SearchResultsModel(ModelSearchState())
+
+
+def test_insert_rows(model):
+    state = model.search_state
+    rows = [make_row(state, 'a', 1, 5), make_row(state, 'b', 3), make_row(state, 'c', 2, 5)]
+    assert model.insert_rows(rows) == sorted(rows, key=lambda pair: -pair[0].time)
+    # Newest first, by default
+    assert uids(model) == ['b', 'c', 'a']
+    assert model.columnCount() == 2
+    assert model.data(model.index(1, 1)) == '5 s'
+    model.insert_rows([make_row(state, 'd', 2.5), make_row(state, 'e', 0)])
+    assert uids(model) == ['b', 'd', 'c', 'a', 'e']
+    assert all(model.row_of(uid) == i for i, uid in enumerate(uids(model)))
+
+    # A row from another subcatalog does not replace the row for its uid...
+    assert model.insert_rows([make_row(state, 'b', 3, 1, catalog='xyz')]) == []
+    assert model.result_row('b').catalog == 'abc'
+    # ...but a row from the same one does, e.g. once the run has finished.
+    model.insert_rows([make_row(state, 'b', 3, 1)])
+    assert model.result_row('b').has_stop
+    # A provisional row is replaced by a row from any subcatalog.
+    model.insert_rows([make_row(state, 'f', 4, catalog=None)])
+    model.insert_rows([make_row(state, 'f', 4, catalog='xyz')])
+    assert model.result_row('f').catalog == 'xyz'
+    assert model.rowCount() == 6
+
+
+def test_sort(model):
+    state = model.search_state
+    model.insert_rows([make_row(state, uid, time, duration) for uid, time, duration in
+                       [('a', 1, 5), ('b', 2, None), ('c', 3, 1), ('d', 4, 5), ('e', 5, 3)]])
+    model.sort(1, Qt.AscendingOrder)
+    assert state.sorted_by == [('Duration', True)]
+    # Missing values last, ties newest first
+    assert uids(model) == ['c', 'e', 'd', 'a', 'b']
+    model.sort(1, Qt.DescendingOrder)
+    assert uids(model) == ['d', 'a', 'e', 'c', 'b']
+    model.sort(0, Qt.DescendingOrder)
+    assert uids(model) == ['e', 'd', 'c', 'b', 'a']
+
+    # Rows inserted, or updated, later are merged in where they belong.
+    model.sort(1, Qt.DescendingOrder)
+    model.insert_rows([make_row(state, 'f', 6, 4), make_row(state, 'b', 2, 2)])
+    assert uids(model) == ['d', 'a', 'f', 'e', 'b', 'c']
+    assert all(model.row_of(uid) == i for i, uid in enumerate(uids(model)))
+
+    model.sort(-1)
+    assert uids(model) == ['f', 'e', 'd', 'c', 'b', 'a']
+
+
+def test_sort_without_row_data(model):
+    state = model.search_state
+    model.insert_rows([make_row(state, 'a', 1, 2), make_row(state, 'b', 2, 1)])
+    # Evicted from the cache of formatted rows
+    del state.row_cache[('a', True)]
+    model.sort(1, Qt.AscendingOrder)
+    assert uids(model) == ['b', 'a']
+    # Re-formatted
+    make_row(state, 'a', 1, 0)
+    model.refresh_rows([('a', True)])
+    assert uids(model) == ['a', 'b']
+
+
+def test_remove_rows(model):
+    state = model.search_state
+    model.insert_rows([make_row(state, uid, time) for uid, time in zip('abcde', range(5))])
+    selected = []
+    model.selected_result.connect(selected.append)
+    model.selected_uids['b'] = None
+    model.remove_rows(['b', 'd', 'e', 'nonexistent'])
+    assert uids(model) == ['c', 'a']
+    assert model.row_of('a') == 1
+    assert 'd' not in model
+    assert not model.selected_uids and selected == [[]]
+
+
+def test_row_cache():
+    cache = RowCache(max_rows=2, max_bytes=10000)
+    cache['a'] = {'x': 1}
+    cache['b'] = {'x': 2}
+    cache['a']
+    cache['c'] = {'x': 3}
+    # The least recently used row is evicted.
+    assert len(cache) == 2
+    with pytest.raises(KeyError):
+        cache['b']
+    assert cache['a'] == {'x': 1}
+
+    cache = RowCache(max_rows=10, max_bytes=1000)
+    for i in range(10):
+        cache[i] = {'x': 'x' * 200}
+    assert len(cache) < 10
+    assert cache[9]
+
+
+def test_query_cache():
+    assert (QueryCache.make_key('abc', {'a': 1, 'b': {'$gt': 2}}) ==
+            QueryCache.make_key('abc', {'b': {'$gt': 2}, 'a': 1}))
+    assert (QueryCache.make_key('abc', {}, [('time', 1)]) !=
+            QueryCache.make_key('abc', {}, [('time', -1)]))
+    cache = QueryCache(max_size=2, ttl=60)
+    for key in 'abc':
+        cache[key] = CachedResults(['abc', 'xyz'])
+    with pytest.raises(KeyError):
+        cache['a']
+    assert not cache['b'].complete
+    cache['b'].catalogs = {'abc': None, 'xyz': None}
+    assert cache['b'].complete
+
+    cache = QueryCache(max_size=2, ttl=-1)
+    cache['a'] = CachedResults(['abc'])
+    with pytest.raises(KeyError):
+        cache['a']
+
+
+def test_query_matches():
+    doc = {'plan_name': 'scan', 'scan_id': 3, 'detectors': ['det1', 'det2']}
+    assert _query_matches({}, doc)
+    assert _query_matches({'plan_name': 'scan', 'scan_id': {'$gte': 3, '$lt': 4}}, doc)
+    assert not _query_matches({'scan_id': {'$gt': 3}}, doc)
+    assert _query_matches({'detectors': 'det2'}, doc)
+    assert _query_matches({'detectors': {'$in': ['det2', 'det3']}}, doc)
+    assert not _query_matches({'detectors': {'$ne': 'det1'}}, doc)
+    assert _query_matches({'sample': {'$ne': 'Ni'}}, doc)
+    assert not _query_matches({'sample': {'$gt': 1}}, doc)
+    assert not _query_matches({'plan_name': {'$gt': 1}}, doc)
+    assert _query_matches({'$or': [{'scan_id': 1}, {'plan_name': 'scan'}]}, doc)
+    assert not _query_matches({'$and': [{'scan_id': 3}, {'plan_name': 'count'}]}, doc)
+    with pytest.raises(UnsupportedQuery):
+        _query_matches({'plan_name': {'$regex': 'sc'}}, doc)
+    with pytest.raises(UnsupportedQuery):
+        _query_matches({'$text': {'$search': 'scan'}}, doc)
+
+
+def test_columns():
+    starts = [{'uid': 'a', 'time': 1.5, 'scan_id': 1},
+              {'uid': 'b', 'time': 2.5, 'plan_name': 'scan'}]
+    columns = _columns(starts)
+    assert list(columns) == ['uid', 'time', 'scan_id', 'plan_name']
+    assert columns['time'].dtype == float
+    assert columns['scan_id'].dtype == float and math.isnan(columns['scan_id'][1])
+    assert columns['plan_name'].tolist() == [None, 'scan']
+
+    # Missing documents, and declared fields that no document has, are NaN.
+    columns = _columns([None, {'time': 3, 'exit_status': 'success'}],
+                       ['time', 'exit_status', 'reason'])
+    assert numpy.isnan(columns['time'][0]) and columns['time'][1] == 3
+    assert columns['exit_status'].tolist() == [None, 'success']
+    assert columns['reason'].dtype == float and numpy.isnan(columns['reason']).all()
+    columns = _columns([None, None], ['time'])
+    assert numpy.isnan(columns['time'] - columns['time']).all()
+
+
+class Clock:
+    "Stands in for the time module, with a monotonic clock that is moved by hand"
+    def __init__(self):
+        self.now = 0.
+
+    def monotonic(self):
+        return self.now
+
+
+class Subcatalog:
+    def __init__(self):
+        self.uids = set()
+        self.reloads = 0
+
+    def force_reload(self):
+        self.reloads += 1
+
+    def __getitem__(self, uid):
+        if uid not in self.uids:
+            raise KeyError(uid)
+        return uid
+
+
+class SchedulingState:
+    "Just enough of a SearchState to schedule reloads, without threads"
+    process_new_runs = SearchState.process_new_runs
+    _run_available = SearchState._run_available
+    reload_interval = SearchState.reload_interval
+
+    def __init__(self, selected_catalogs):
+        self.selected_catalogs = selected_catalogs
+        self.new_run_queue = queue.Queue()
+        self._pending_runs = {}
+        self.reload_event = threading.Event()
+        self.not_found = []
+        self.run_not_found = types.SimpleNamespace(emit=self.not_found.append)
+        self.push_reloads = False
+        self._empty_reloads = 0
+
+
+def test_new_run_retries(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(search, 'time', clock)
+    subcatalog = Subcatalog()
+    state = SchedulingState({'abc': subcatalog})
+    state.new_run_queue.put('a')
+    state.process_new_runs()
+    # Looked up right away, then after each of the delays
+    for attempt, delay in enumerate(NEW_RUN_RETRY_DELAYS, 1):
+        assert state._pending_runs == {'a': (clock.now + delay, attempt)}
+        clock.now += delay
+        state.process_new_runs()
+    assert subcatalog.reloads == len(NEW_RUN_RETRY_DELAYS) + 1
+    assert state._pending_runs == {} and state.not_found == ['a']
+    assert not state.reload_event.is_set()
+
+    state.new_run_queue.put('b')
+    state.process_new_runs()
+    subcatalog.uids.add('b')
+    clock.now += NEW_RUN_RETRY_DELAYS[0]
+    state.process_new_runs()
+    assert state._pending_runs == {} and state.not_found == ['a']
+    assert state.reload_event.is_set()
+
+
+def test_reload_interval():
+    state = SchedulingState({})
+    intervals = []
+    for state._empty_reloads in range(10):
+        intervals.append(state.reload_interval())
+    assert intervals[:3] == [RELOAD_INTERVAL, 2 * RELOAD_INTERVAL, 4 * RELOAD_INTERVAL]
+    assert intervals == sorted(intervals) and intervals[-1] == MAX_RELOAD_INTERVAL
+    # A live stream pokes reloads, so polling is only a fallback.
+    state.push_reloads = True
+    state._empty_reloads = 0
+    assert state.reload_interval() == MAX_RELOAD_INTERVAL
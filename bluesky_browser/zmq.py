@@ -11,6 +11,8 @@ log = logging.getLogger('bluesky_browser')
 class ConsumerThread(QThread):
     documents = Signal([tuple])
     new_run_uid = Signal([str])
+    new_run_start = Signal([object])
+    new_run_stop = Signal([object])
 
     def __init__(self, *args, zmq_address, **kwargs):
         super().__init__(*args, **kwargs)
@@ -19,7 +21,10 @@ class ConsumerThread(QThread):
         def callback(name, doc):
             if name == 'start':
                 self.new_run_uid.emit(doc['uid'])
+                self.new_run_start.emit(doc)
                 log.debug("New streaming Run: uid=%r", doc['uid'])
+            elif name == 'stop':
+                self.new_run_stop.emit(doc)
             self.documents.emit((name, doc))
 
         self.dispatcher.subscribe(callback)